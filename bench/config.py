@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot import config
+
+
+NETWORKS = 3
+PLUGINS = 30
+
+
+class Core(object):
+    def __init__(self, path):
+        self.config_path = os.path.join(path, 'config.yaml')
+        self.data_path = path
+
+
+def write_config(path):
+    with open(os.path.join(path, 'config.yaml'), 'w') as f:
+        for network in range(NETWORKS):
+            f.write('network%d:\n  host: irc%d.example.net\n  port: 6667\n'
+                    '  plugins:\n' % (network, network))
+            for plugin in range(PLUGINS):
+                f.write('    plugin%d:\n      option: value\n'
+                        '      items:\n        - one\n        - two\n'
+                        % plugin)
+
+
+def startup(core, use_cache):
+    config.use_cache = use_cache
+    config.stamp = None
+    start = perf_counter()
+    config.load(core)
+    for network in config.config:
+        for plugin in range(PLUGINS):
+            config.load(core)
+            config.network(network).get('plugins').get('plugin%d' % plugin)
+    return perf_counter() - start
+
+
+def legacy(core):
+    start = perf_counter()
+    data = config.parse(core.config_path)
+    for network in data:
+        for plugin in range(PLUGINS):
+            data = config.parse(core.config_path)
+            data[network].get('plugins').get('plugin%d' % plugin)
+    return perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        write_config(path)
+        core = Core(path)
+        print('%d networks x %d plugins' % (NETWORKS, PLUGINS))
+        print('parse per plugin   %.3f s' % legacy(core))
+        print('mtime cache        %.3f s' % startup(core, False))
+        startup(core, True)
+        print('pickle parse cache %.3f s' % startup(core, True))
+
+
+if __name__ == '__main__':
+    main()
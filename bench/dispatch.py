@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import sys
+from contextlib import nullcontext
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.decorators import hook
+from pybot.hook import HookManager
+from pybot.permissions import Permissions
+
+
+LINES = 200000
+PLUGINS = 20
+
+lines = [
+    ':nick!user@host.example PRIVMSG #channel :just chatting about things',
+    ':nick!user@host.example PRIVMSG #channel :!song search something',
+    ':nick!user@host.example JOIN #channel',
+    ':irc.example.net 372 pybot :- message of the day',
+    'PING :irc.example.net',
+]
+
+
+class Core(object):
+    def wakeup(self, timestamp=None):
+        pass
+
+
+class Bot(object):
+    core = Core()
+    network = 'bench'
+    nick = 'pybot'
+    directed_triggers = False
+    allow_rules = {'*': {'ANY': 1}}
+    deny_rules = {}
+
+
+    def lower(self, name):
+        return name.lower()
+
+
+    def batch(self):
+        return nullcontext()
+
+
+class Plugin(object):
+    def __init__(self, name):
+        self.name = name
+
+
+    @hook
+    def recv_event(self, line):
+        pass
+
+
+    @hook
+    def privmsg_command(self, msg):
+        pass
+
+
+    @hook
+    def join_command(self, msg):
+        pass
+
+
+    @hook
+    def ping_command(self, msg):
+        pass
+
+
+    @hook
+    def song_search_trigger(self, msg, args, argstr):
+        pass
+
+
+def main():
+    bot = Bot()
+    bot.permissions = Permissions(bot)
+    hooks = HookManager(bot)
+    for i in range(PLUGINS):
+        hooks.install_owner(Plugin('plugin%d' % i))
+
+    n = LINES // len(lines)
+    start = perf_counter()
+    for _ in range(n):
+        for line in lines:
+            hooks.call_event('recv', line)
+    elapsed = perf_counter() - start
+
+    count = n * len(lines)
+    print("call_event('recv'): %d lines in %.3f s, %.0f lines/s" % (count,
+            elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
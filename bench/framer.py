@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import random
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.client import Client
+
+
+SIZE = 50 * 1024 * 1024
+CHUNK = 16384
+LEGACY_CHUNK = 1024
+
+lines = [
+    b':nick!user@host.example PRIVMSG #channel :just chatting about things',
+    b':irc.example.net 353 pybot = #channel :' +
+            b' '.join(b'@nick%d' % i for i in range(60)),
+    b':nick!user@host.example QUIT :irc.example.net irc2.example.net',
+    b':nick!user@host.example JOIN #channel',
+    b'@time=2020-01-01T00:00:00.000Z :nick!user@host.example PRIVMSG '
+            b'#channel :playback from the bouncer',
+    b'PING :irc.example.net',
+]
+
+
+class Hooks(object):
+    def __init__(self):
+        self.count = 0
+
+
+    def call_event(self, event, line):
+        self.count += 1
+
+
+class Legacy(object):
+    def __init__(self, hooks):
+        self.hooks = hooks
+        self.recvbuf = b''
+
+
+    def data_received(self, data):
+        self.recvbuf += data
+
+        parts = self.recvbuf.split(b'\r\n')
+        lines, self.recvbuf = parts[:-1], parts[-1]
+
+        for line in lines:
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                line = line.decode('latin-1')
+            self.hooks.call_event('recv', line)
+
+
+def traffic():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            return f.read()
+
+    random.seed(0)
+    data = bytearray()
+    while len(data) < SIZE:
+        data += random.choice(lines) + b'\r\n'
+    return bytes(data)
+
+
+def legacy(data):
+    hooks = Hooks()
+    framer = Legacy(hooks)
+    start = perf_counter()
+    for i in range(0, len(data), LEGACY_CHUNK):
+        framer.data_received(data[i:i + LEGACY_CHUNK])
+    return hooks.count, perf_counter() - start
+
+
+def framer(data):
+    hooks = Hooks()
+    client = Client(('localhost', 6667))
+    client.hooks = hooks
+    client.connected = True
+    view = memoryview(data)
+    start = perf_counter()
+    offset = 0
+    while offset < len(data):
+        buf = client.get_buffer(-1)
+        n = min(len(buf), CHUNK, len(data) - offset)
+        buf[:n] = view[offset:offset + n]
+        del buf
+        client.buffer_updated(n)
+        offset += n
+    return hooks.count, perf_counter() - start
+
+
+def main():
+    data = traffic()
+    mb = len(data) / 1024 / 1024
+    for name, fn in (('split', legacy), ('recv_into', framer)):
+        count, elapsed = fn(data)
+        print('%-10s %d lines, %.1f MB in %.3f s, %.1f MB/s' % (name, count,
+                mb, elapsed, mb / elapsed))
+
+
+if __name__ == '__main__':
+    main()
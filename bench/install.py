@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.decorators import hook
+from pybot.hook import HookManager
+
+
+BOTS = 50
+HOOKS = 60
+ROUNDS = 20
+
+
+class Core(object):
+    def wakeup(self, timestamp=None):
+        pass
+
+
+class Bot(object):
+    core = Core()
+    network = 'bench'
+
+
+def make_plugin():
+    attrs = {'name': 'large', 'value': 1, 'helper': lambda self: None}
+    for i in range(HOOKS):
+        def fn(self, msg, args, argstr):
+            pass
+        fn.__name__ = 'action%d_trigger' % i
+        attrs[fn.__name__] = hook(fn)
+    return type('Plugin', (object,), attrs)
+
+
+def main():
+    managers = [HookManager(Bot()) for _ in range(BOTS)]
+    plugin_class = make_plugin()
+
+    installing = 0.0
+    for _ in range(ROUNDS):
+        plugin = plugin_class()
+        start = perf_counter()
+        for hooks in managers:
+            hooks.install_owner(plugin)
+        installing += perf_counter() - start
+        for hooks in managers:
+            hooks.uninstall_owner(plugin)
+
+    count = ROUNDS * BOTS
+    print('install_owner: %d plugins of %d hooks in %.3f s, %.0f us each' % (
+            count, HOOKS, installing, installing / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
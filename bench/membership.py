@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.bot import Bot
+from pybot.message import Message
+
+
+POOL = 40000
+USERS = 10000
+CHANNELS = 20
+NAMES_PER_LINE = 40
+
+
+def names(index):
+    modes = ['', '', '', '+', '@']
+    channel = '#channel%d' % index
+    first = index * POOL // CHANNELS
+    nicks = ['%suser%d' % (modes[i % len(modes)], i % POOL)
+             for i in range(first, first + USERS)]
+    for i in range(0, len(nicks), NAMES_PER_LINE):
+        yield ':irc.example.net 353 pybot = %s :%s' % (channel,
+                ' '.join(nicks[i:i + NAMES_PER_LINE]))
+
+
+def legacy(lines):
+    channels = {}
+    for channel in range(CHANNELS):
+        nicks = channels['#channel%d' % channel] = set()
+        for line in lines[channel]:
+            for nick in line.rsplit(':', 1)[1].split():
+                if nick.startswith(('~', '&', '@', '%', '+')):
+                    nicks.add(nick[1:])
+                else:
+                    nicks.add(nick)
+
+    start = perf_counter()
+    for i in range(0, POOL, 10):
+        nick = 'user%d' % i
+        for props in channels.values():
+            if nick in props:
+                props.remove(nick)
+    return channels, perf_counter() - start
+
+
+def store(lines):
+    bot = Bot.__new__(Bot)
+    bot.nick = 'pybot'
+    bot.channels = {}
+    bot.users = {}
+    bot.isupport = {}
+    bot.userhost = None
+    bot.wraplens = {}
+    bot.set_casemapping('rfc1459')
+    bot.set_prefix('(qaohv)~&@%+')
+
+    for channel in range(CHANNELS):
+        name = '#channel%d' % channel
+        bot.join_command(Message(':pybot!p@h JOIN %s' % name, bot))
+        for line in lines[channel]:
+            bot._353_command(Message(line, bot))
+
+    quits = [Message(':user%d!u@h QUIT :bye' % i, bot)
+             for i in range(0, POOL, 10)]
+    start = perf_counter()
+    for msg in quits:
+        bot.quit_command(msg)
+    return bot, perf_counter() - start
+
+
+def main():
+    lines = [list(names(channel)) for channel in range(CHANNELS)]
+
+    for name, fn in (('sets', legacy), ('store', store)):
+        tracemalloc.start()
+        state, elapsed = fn(lines)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('%-6s %d x %d-user channels: %5.1f MB, %d quits in %.3f s'
+                % (name, CHANNELS, USERS, size / 1024 / 1024, POOL // 10,
+                elapsed))
+
+
+if __name__ == '__main__':
+    main()
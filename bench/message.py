@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import re
+import sys
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.message import Message, parse_params
+
+
+LINES = 500000
+RETAINED = 100000
+
+lines = [
+    ':nick!user@host.example PRIVMSG #channel :just chatting about things',
+    ':nick!user@host.example PRIVMSG #channel :!song search something',
+    ':irc.example.net 353 pybot = #channel :@nick1 +nick2 nick3 nick4',
+    ':nick!user@host.example QUIT :irc.example.net irc2.example.net',
+    ':nick!user@host.example JOIN #channel',
+    'PING :irc.example.net',
+]
+
+message_re = re.compile(
+  '^(?:'                            +
+    ':(?P<prefix>'                  +
+      '(?P<source>[^ !@]+)'         +
+      '(?:'                         +
+        '(?:!(?P<user>[^ @]+))?'    +
+        '@(?P<host>[^ ]+)'          +
+      ')?'                          +
+    ') '                            +
+  ')?'                              +
+  '(?P<cmd>[^ :]+)'                 +
+  '(?: (?P<params>.+))?$'
+)
+
+
+class Bot(object):
+    network = 'bench'
+    nick = 'pybot'
+    directed_triggers = False
+    config = {'bench': {}}
+
+    def lower(self, name):
+        return name.lower()
+
+
+class Legacy(object):
+    def __init__(self, line, bot=None):
+        self.bot = bot
+        self.raw = line
+        self.reply_to = None
+        self.time = datetime.utcnow()
+        self.channel = None
+        self.trigger = None
+        self.permissions = {}
+        d = message_re.match(line).groupdict()
+        d['cmd'] = d['cmd'].upper()
+        d['param'] = parse_params(d['params'])
+        del d['params']
+        self.__dict__.update(d)
+
+        if self.cmd in ('PRIVMSG', 'NOTICE'):
+            if self.param[0].startswith(('&', '#', '+', '!')):
+                self.channel = self.param[0].lower()
+                self.reply_to = self.param[0]
+            else:
+                self.reply_to = self.source
+
+        if self.cmd == 'PRIVMSG':
+            text = self.param[-1]
+            directed_triggers = self.bot.config[self.bot.network] \
+                    .get('directed_triggers', False)
+            if not directed_triggers and text.startswith('!'):
+                self.trigger = text[1:]
+
+
+def parse(cls, bot):
+    n = LINES // len(lines)
+    start = perf_counter()
+    for _ in range(n):
+        for line in lines:
+            cls(line, bot)
+    return n * len(lines) / (perf_counter() - start)
+
+
+def route(cls, bot):
+    n = LINES // len(lines)
+    start = perf_counter()
+    for _ in range(n):
+        for line in lines:
+            msg = cls(line, bot)
+            if msg.cmd == 'PRIVMSG':
+                msg.trigger, msg.channel, msg.param
+    return n * len(lines) / (perf_counter() - start)
+
+
+def memory(cls, bot):
+    tracemalloc.start()
+    retained = [cls(lines[i % len(lines)], bot) for i in range(RETAINED)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(retained)
+
+
+def main():
+    bot = Bot()
+    for name, cls in (('regex', Legacy), ('lazy', Message)):
+        print('%-6s parse %9.0f lines/s   route %9.0f lines/s   %4.0f bytes/msg'
+                % (name, parse(cls, bot), route(cls, bot), memory(cls, bot)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.bot import Bot
+
+
+ROUNDS = 2000
+CHANNELS = ['#channel%d' % i for i in range(6)]
+REPLIES = ['result %d' % i for i in range(4)]
+
+
+def bot(coalesce_replies, targmax):
+    b = Bot.__new__(Bot)
+    b.nick = 'pybot'
+    b.userhost = 'pybot@host.example'
+    b.isupport = {}
+    b.wraplens = {}
+    b.channels = {}
+    b.users = {}
+    b.outbox = []
+    b.batch_depth = 0
+    b.coalesce_replies = coalesce_replies
+    b.set_casemapping('rfc1459')
+    b.set_targmax(targmax)
+    b.lines = []
+    b.send = b.lines.append
+    return b
+
+
+def run(b):
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        with b.batch():
+            for channel in CHANNELS:
+                b.privmsg(channel, 'announcement: new release is out')
+            for reply in REPLIES:
+                b.privmsg('#channel0', reply)
+    return len(b.lines), perf_counter() - start
+
+
+def main():
+    for name, coalesce, targmax in (
+            ('unbatched', False, ''),
+            ('targmax', False, 'PRIVMSG:4,NOTICE:4'),
+            ('coalesce', True, 'PRIVMSG:4,NOTICE:4')):
+        lines, elapsed = run(bot(coalesce, targmax))
+        print('%-10s %6d lines for %d rounds in %.3f s'
+                % (name, lines, ROUNDS, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import gc
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.plugins import math
+
+
+WORKBOOKS = 50
+FUNCS = 40
+
+
+class Core(object):
+    def __init__(self, path):
+        self.data_path = path
+
+
+class Bot(object):
+    network = 'bench'
+
+    def __init__(self, core):
+        self.core = core
+
+
+class Message(object):
+    def reply(self, text):
+        pass
+
+
+def warm_up(plugin, targets):
+    msg = Message()
+    for target in targets:
+        workbook = plugin.get_workbook('bench', target)
+        for i in range(FUNCS):
+            plugin.define_func(msg, workbook, 'f%d' % i, 'a, b',
+                    'a * %d + b' % i)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        bot = Bot(Core(path))
+        targets = ['#channel%d' % i for i in range(WORKBOOKS)]
+
+        old = math.Plugin(bot, 'math', math)
+        old.on_load(False)
+        warm_up(old, targets)
+
+        gc.collect()
+        start = perf_counter()
+        cold = math.Plugin(bot, 'math', math)
+        cold.on_load(True)
+        for target in targets:
+            cold.get_workbook('bench', target)
+        cold_elapsed = perf_counter() - start
+        cold.on_unload()
+        del cold
+
+        gc.collect()
+        start = perf_counter()
+        warm = math.Plugin(bot, 'math', math)
+        warm.on_load(True)
+        warm.set_state(old.get_state())
+        warm_elapsed = perf_counter() - start
+        for target in targets:
+            warm.get_workbook('bench', target)
+        used_elapsed = perf_counter() - start
+        warm.on_unload()
+
+    print('math reload, %d workbooks of %d funcs:' % (WORKBOOKS, FUNCS))
+    print('  cold reload and first use: %.1f ms' % (cold_elapsed * 1e3))
+    print('  state handoff: %.1f ms' % (warm_elapsed * 1e3))
+    print('  state handoff and first use: %.1f ms' % (used_elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import os
+import random
+import sys
+from time import perf_counter, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybot.hook import HookManager, TimestampHook
+
+
+TIMERS = 100000
+REARMS = 100000
+
+
+class Core(object):
+    def wakeup(self, timestamp=None):
+        pass
+
+
+class Bot(object):
+    core = Core()
+
+
+def noop():
+    pass
+
+
+def bench(name, fn, n):
+    start = perf_counter()
+    fn()
+    elapsed = perf_counter() - start
+    print('%-24s %8.3f s  %8.2f us/op' % (name, elapsed, elapsed / n * 1e6))
+
+
+def main():
+    bot = Bot()
+    hooks = HookManager(bot)
+    now = time()
+    timestamps = [now + random.uniform(60, 3600) for _ in range(TIMERS)]
+    handles = []
+
+    def install():
+        for timestamp in timestamps:
+            hook = TimestampHook(timestamp)
+            hook.bind(noop, bot)
+            hooks.install(hook)
+            handles.append(hook)
+
+    def rearm():
+        hook = handles[0]
+        for i in range(REARMS):
+            hook.cancel()
+            hook = TimestampHook(now + 120)
+            hook.bind(noop, bot)
+            hooks.install(hook)
+
+    def cancel():
+        for hook in handles:
+            hook.cancel()
+
+    def fire():
+        hooks.call_timestamp(now + 3600)
+
+    bench('install %d' % TIMERS, install, TIMERS)
+    bench('cancel+rearm %d' % REARMS, rearm, REARMS)
+    bench('fire all', fire, TIMERS)
+
+    handles[:] = []
+    install()
+    bench('cancel %d' % TIMERS, cancel, TIMERS)
+
+
+if __name__ == '__main__':
+    main()
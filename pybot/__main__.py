@@ -1,10 +1,53 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
-from .core import Core
+import argparse
+
 
 def main():
-    core = Core()
+    parser = argparse.ArgumentParser(prog='pybot')
+    parser.add_argument('--asyncio', action='store_true',
+            help='run on the asyncio core, allowing async def hooks')
+    parser.add_argument('--shard', action='store_true',
+            help='run each network group in its own worker process')
+    parser.add_argument('--config-cache', action='store_true',
+            help='keep a pickled parse of config.yaml in the data directory')
+    parser.add_argument('--watch-config', action='store_true',
+            help='reload config.yaml automatically when it changes')
+    parser.add_argument('--production', action='store_true',
+            help='skip the reloader import hooks; plugin reloads fall back '
+                 'to importlib.reload')
+    parser.add_argument('--profile-imports', metavar='FILE',
+            help='write a per-module import time breakdown of startup')
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile_imports:
+        from .profiling import ImportProfiler
+        profiler = ImportProfiler()
+        profiler.install()
+
+    from . import config
+    from .core import Core
+
+    config.use_cache = args.config_cache
+
+    core_class = Core
+    if args.asyncio:
+        from .aio import AsyncCore
+        core_class = AsyncCore
+
+    if args.shard:
+        from .supervisor import Supervisor
+        core = Supervisor(core_class, args.watch_config, args.production)
+    else:
+        core = core_class(watch=args.watch_config,
+                production=args.production)
+
+    if profiler:
+        profiler.uninstall()
+        profiler.write(args.profile_imports)
+
     core.run()
 
 if __name__ == '__main__':
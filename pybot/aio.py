@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import asyncio
+import signal
+import traceback
+from time import time
+
+from .client import Client
+from .core import Core
+
+
+class AsyncCore(Core):
+    def __init__(self, networks=None, link=None, watch=False,
+            production=False):
+        self.loop = asyncio.new_event_loop()
+        self.tasks = set()
+        self.event = None
+        self.deadline = None
+        Core.__init__(self, networks, link, watch, production)
+
+
+    def update_selectable(self, obj, events=None):
+        if isinstance(obj, Client):
+            return
+
+        if events is None:
+            events = 1 if obj.can_read() else 0
+
+        if events:
+            self.loop.add_reader(obj.fileno(), obj.do_read)
+        else:
+            self.loop.remove_reader(obj.fileno())
+
+
+    def wakeup(self, timestamp=None):
+        if not self.event:
+            return
+        if timestamp is None or self.deadline is None or \
+                timestamp < self.deadline:
+            self.event.set()
+
+
+    def call_soon_threadsafe(self, fn, *args):
+        self.loop.call_soon_threadsafe(fn, *args)
+
+
+    def spawn(self, coro):
+        task = self.loop.create_task(self.guard(coro))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+    async def guard(self, coro):
+        try:
+            await coro
+        except Exception:
+            print('coroutine error:')
+            traceback.print_exc()
+
+
+    def run(self):
+        self.running = True
+        if not self.link:
+            try:
+                self.loop.add_signal_handler(signal.SIGINT, self.shutdown,
+                        'KeyboardInterrupt')
+            except NotImplementedError:
+                pass
+
+        try:
+            self.loop.run_until_complete(self.main())
+            self.loop.run_until_complete(self.cancel_tasks())
+        finally:
+            self.loop.close()
+
+
+    async def cancel_tasks(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    async def main(self):
+        self.event = asyncio.Event()
+        while self.running:
+            timeout = self.next_timeout()
+            self.deadline = None if timeout is None else time() + timeout
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.event.clear()
+
+            self.run_timers()
+
+            if self.in_shutdown:
+                if not any(obj.connected for obj in self.selectable):
+                    self.running = False
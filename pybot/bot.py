@@ -1,42 +1,134 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
-from textwrap import wrap
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
 from time import time
 
 from . import config
 from .client import Client
 from .decorators import hook, priority
 from .hook import HookManager, TimestampHook
+from .membership import Channel, User, casemaps, parse_prefix_modes
+from .message import parse_tags
+from .permissions import Permissions
 from .plugin import PluginManager
 
 
+split_re = re.compile(r'^[^ ]+\.[^ ]+ [^ ]+\.[^ ]+$')
+split_quit_re = re.compile(r'^(?:@([^ ]+) )?:([^! ]+)[^ ]* QUIT :(.*)$')
+
+
+min_wraplen = 16
+max_wraplens = 1024
+whitespace_map = str.maketrans('\n\r\v\f', '    ')
+
+
+def split_utf8(text, limit):
+    limit = max(limit, min_wraplen)
+    data = text.expandtabs().translate(whitespace_map).encode('utf-8')
+    lines = []
+    while len(data) > limit:
+        cut = data.rfind(b' ', 0, limit + 1)
+        line = data[:cut].rstrip(b' ') if cut > 0 else None
+        if line:
+            lines.append(line)
+            data = data[cut + 1:].lstrip(b' ')
+            continue
+
+        cut = limit
+        while cut > 0 and data[cut] & 0xc0 == 0x80:
+            cut -= 1
+        if not cut:
+            cut = 1
+            while cut < len(data) and data[cut] & 0xc0 == 0x80:
+                cut += 1
+        lines.append(data[:cut])
+        data = data[cut:]
+    data = data.rstrip(b' ')
+    if data:
+        lines.append(data)
+    return [line.decode('utf-8') for line in lines]
+
+
 class Bot(Client):
+    netsplit_memory = 3600
+
     def __init__(self, core, network):
         self.core = core
         self.network = network
 
-        host = config.config[self.network].get('host')
-        port = config.config[self.network].get('port')
-        ssl = config.config[self.network].get('ssl', 'false')
-        if port == None:
-            port = 6697 if ssl else 6667
+        self.config = config.network(self.network)
+        remote, ssl = self.endpoint()
+        recv_buffer = self.config.get('recv_buffer')
+        flood_burst = self.config.get('flood_burst')
+        flood_cost = self.config.get('flood_cost')
+        connect_timeout = self.config.get('connect_timeout')
+        handshake_timeout = self.config.get('handshake_timeout')
 
-        Client.__init__(self, (host, port), ssl)
+        Client.__init__(self, remote, ssl, recv_buffer, flood_burst,
+                flood_cost, connect_timeout, handshake_timeout)
         self.hooks = HookManager(self)
         self.plugins = PluginManager(self)
 
         self.hooks.install_owner(self)
 
         self.nick = None
+        self.userhost = None
+        self.wraplens = {}
+        self.outbox = []
+        self.batch_depth = 0
         self.channels = {}
+        self.users = {}
+        self.isupport = {}
+        self.caps = set()
+        self.batches = {}
+        self.splits = OrderedDict()
+        self.split_users = {}
+        self.split_hook = None
+        self.set_casemapping('rfc1459')
+        self.set_prefix('(qaohv)~&@%+')
+        self.set_targmax('')
         self.allow_rules = {'*': {'ANY': 1}}
         self.deny_rules = {}
+        self.permissions = Permissions(self)
+        self.configure()
 
         for plugin in config.autoload_list(self):
-            self.plugins.load(plugin)
+            self.plugins.autoload(plugin)
+
 
-        self.connect()
+    def endpoint(self):
+        host = self.config.get('host')
+        port = self.config.get('port')
+        ssl = self.config.get('ssl', False)
+        if port == None:
+            port = 6697 if ssl else 6667
+        return (host, port), ssl
+
+
+    def configure(self):
+        self.config = config.network(self.network)
+        self.directed_triggers = self.config.get('directed_triggers', False)
+        self.coalesce_replies = self.config.get('coalesce_replies', False)
+
+
+    def reconfigure(self):
+        old = self.config
+        self.configure()
+        if self.config == old:
+            return
+
+        remote, ssl = self.endpoint()
+        if (remote, ssl) != (self.remote, self.use_ssl):
+            self.remote = remote
+            self.use_ssl = ssl
+            self.tls_context = None
+            if self.connected or self.state:
+                self.disconnect()
+
+        self.plugins.reconfigure(old, self.config)
 
 
     def set_timer(self, fn, timestamp, owner=None):
@@ -47,6 +139,8 @@ class Bot(Client):
 
 
     def set_interval(self, fn, seconds, owner=None):
+        if seconds <= 0:
+            raise Exception('interval must be positive')
         hook = TimestampHook(time() + seconds, {'repeat': seconds})
         hook.bind(fn, owner)
         self.hooks.install(hook)
@@ -60,53 +154,231 @@ class Bot(Client):
         return hook
 
 
+    def next_tick(self):
+        timestamps = [self.hooks.next_timestamp(), Client.next_tick(self)]
+        timestamps = [timestamp for timestamp in timestamps
+                if timestamp is not None]
+        return min(timestamps) if timestamps else None
+
+
     def do_tick(self, timestamp):
+        Client.do_tick(self, timestamp)
         self.hooks.call_timestamp(timestamp)
 
 
-    def privmsg(self, target, text):
-        wraplen = 510
-        wraplen -= 1 + len(self.nick) # ":<nick>"
-        wraplen -= 1 + 10 # "!<user>"
-        wraplen -= 1 + 63 # "@<host>"
-        wraplen -= 9 # " PRIVMSG "
-        wraplen -= len(target) # "<target>"
+    def wraplen(self, command, target):
+        wraplen = self.wraplens.get((command, target))
+        if wraplen is not None:
+            return wraplen
+
+        wraplen = int(self.isupport.get('LINELEN') or 512)
+        wraplen -= 2 # "\r\n"
+        if self.nick:
+            wraplen -= 1 + len(self.nick.encode('utf-8')) # ":<nick>"
+        else:
+            wraplen -= 1 + int(self.isupport.get('NICKLEN') or 30)
+        if self.userhost:
+            wraplen -= 1 + len(self.userhost.encode('utf-8')) # "!<userhost>"
+        else:
+            wraplen -= 1 + int(self.isupport.get('USERLEN') or 10) # "!<user>"
+            wraplen -= 1 + 63 # "@<host>"
+        wraplen -= 2 + len(command) # " <command> "
+        wraplen -= len(target.encode('utf-8')) # "<target>"
         wraplen -= 2 # " :"
-        for line in wrap(text, wraplen):
-            self.send('PRIVMSG %s :%s' % (target, line))
+
+        if len(self.wraplens) >= max_wraplens:
+            self.wraplens.clear()
+        self.wraplens[(command, target)] = wraplen
+        return wraplen
+
+
+    def set_userhost(self, nick=None, userhost=None):
+        if nick:
+            self.nick = nick
+        if userhost:
+            self.userhost = userhost
+        self.wraplens.clear()
+
+
+    @contextmanager
+    def batch(self):
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                self.flush_outbox()
+
+
+    def send(self, line):
+        if self.outbox:
+            self.flush_outbox()
+        Client.send(self, line)
+
+
+    def flush_outbox(self):
+        entries, self.outbox = self.outbox, []
+        if self.coalesce_replies:
+            entries = self.coalesce(entries)
+
+        lines = []
+        groups = {}
+        last = {}
+        for command, target, text in entries:
+            key = self.lower(target)
+            limit = self.targmax.get(command, 1)
+            budget = self.wraplen(command, '')
+            for line in split_utf8(text, self.wraplen(command, target)):
+                i = groups.get((command, line))
+                if i is not None and last.get(key, -1) < i:
+                    targets = lines[i][1] + [target]
+                    size = len(line.encode('utf-8'))
+                    size += len(','.join(targets).encode('utf-8'))
+                    if (limit is None or len(targets) <= limit) and \
+                            size <= budget:
+                        lines[i] = (command, targets, line)
+                        last[key] = i
+                        continue
+
+                groups[(command, line)] = last[key] = len(lines)
+                lines.append((command, [target], line))
+
+        for command, targets, line in lines:
+            self.send('%s %s :%s' % (command, ','.join(targets), line))
+
+
+    def coalesce(self, entries):
+        merged = []
+        for command, target, text in entries:
+            if merged and merged[-1][:2] == (command, target):
+                combined = merged[-1][2] + ' | ' + text
+                if len(combined.encode('utf-8')) <= \
+                        self.wraplen(command, target):
+                    merged[-1] = (command, target, combined)
+                    continue
+            merged.append((command, target, text))
+        return merged
+
+
+    def say(self, command, target, text):
+        if self.batch_depth:
+            self.outbox.append((command, target, text))
+            return
+
+        for line in split_utf8(text, self.wraplen(command, target)):
+            self.send('%s %s :%s' % (command, target, line))
+
+
+    def privmsg(self, target, text):
+        self.say('PRIVMSG', target, text)
 
 
     def notice(self, target, text):
-        wraplen = 510
-        wraplen -= 1 + len(self.nick) # ":<nick>"
-        wraplen -= 1 + 10 # "!<user>"
-        wraplen -= 1 + 63 # "@<host>"
-        wraplen -= 8 # " NOTICE "
-        wraplen -= len(target) # "<target>"
-        wraplen -= 2 # " :"
-        for line in wrap(text, wraplen):
-            self.send('NOTICE %s :%s' % (target, line))
+        self.say('NOTICE', target, text)
+
+
+    def lower(self, name):
+        return name.translate(self.casemap)
+
+
+    def is_me(self, nick):
+        return bool(self.nick) and self.lower(nick) == self.lower(self.nick)
+
+
+    def set_casemapping(self, casemapping):
+        self.casemap = casemaps.get(casemapping, casemaps['rfc1459'])
+
+        self.channels = {self.lower(channel.name): channel
+                         for channel in self.channels.values()}
+        for user in self.users.values():
+            user.key = self.lower(user.nick)
+        for channel in self.channels.values():
+            modes = [(channel.members[key], mode)
+                     for key, mode in channel.modes.items()]
+            channel.members = {user.key: user
+                               for user in channel.members.values()}
+            channel.modes = {user.key: mode for user, mode in modes}
+        self.users = {user.key: user for user in self.users.values()}
+
+
+    def set_targmax(self, value):
+        self.targmax = {}
+        for token in value.split(','):
+            if not token:
+                continue
+            command, _, limit = token.partition(':')
+            self.targmax[command.upper()] = int(limit) if limit else None
+
+
+    def set_prefix(self, value):
+        modes, symbols = parse_prefix_modes(value)
+        self.prefix_modes = {}
+        self.prefix_symbols = {}
+        for i, (mode, symbol) in enumerate(zip(modes, symbols)):
+            bit = 1 << (len(modes) - i - 1)
+            self.prefix_modes[mode] = bit
+            self.prefix_symbols[symbol] = bit
+
+
+    def get_user(self, nick):
+        key = self.lower(nick)
+        user = self.users.get(key)
+        if not user:
+            user = User(nick if key == nick else key, nick)
+            self.users[user.key] = user
+        return user
+
+
+    def add_member(self, channel, nick, modes=0):
+        user = self.get_user(nick)
+        if user.key not in channel.members:
+            channel.members[user.key] = user
+            user.channels.append(channel)
+        if modes:
+            channel.modes[user.key] = channel.modes.get(user.key, 0) | modes
+        return user
+
+
+    def remove_member(self, channel, nick):
+        key = self.lower(nick)
+        user = channel.members.pop(key, None)
+        if not user:
+            return
+        channel.modes.pop(key, None)
+        user.channels.remove(channel)
+        if not user.channels:
+            del self.users[key]
+
+
+    def clear_channel(self, channel):
+        for user in channel.members.values():
+            user.channels.remove(channel)
+            if not user.channels:
+                del self.users[user.key]
+        channel.members.clear()
+        channel.modes.clear()
 
 
     def join(self, channels, keys=None):
         if isinstance(channels, str):
             channels = (channels,)
-        channels = list(map(str.lower, channels))
+        if isinstance(keys, str):
+            keys = (keys,)
+        channels = list(channels)
+        keys = list(keys or [])
         if channels:
             channel_s = ','.join(channels)
             if keys:
-                if isinstance(keys, str):
-                    keys = (keys,)
-                key_s = ','.join(keys)
-                self.send('JOIN %s %s' % (channel_s, key_s))
-                pairs = list(zip(channels, keys))
-                for item in pairs:
-                    self.channels[item[0]] = {'key': item[1], 'joined': False,
-                            'nicks': set()}
+                self.send('JOIN %s %s' % (channel_s, ','.join(keys)))
             else:
                 self.send('JOIN %s' % channel_s)
-                for channel in channels:
-                    self.channels[channel] = {'joined': False, 'nicks': set()}
+            keys += [None] * (len(channels) - len(keys))
+            for name, key in zip(channels, keys):
+                channel = self.channels.get(self.lower(name))
+                if not channel:
+                    channel = self.channels[self.lower(name)] = Channel(name)
+                channel.key = key
 
 
     def part(self, channels, message=None):
@@ -123,9 +395,19 @@ class Bot(Client):
     @hook
     @priority(0)
     def disconnect_event(self):
-        for _, props in list(self.channels.items()):
-            props['joined'] = False
-            props['nicks'].clear()
+        self.caps.clear()
+        del self.outbox[:]
+        self.batches.clear()
+        self.splits.clear()
+        self.split_users.clear()
+        if self.split_hook:
+            self.split_hook.cancel()
+            self.split_hook = None
+        for channel in self.channels.values():
+            channel.joined = False
+            channel.members.clear()
+            channel.modes.clear()
+        self.users.clear()
 
 
     @hook
@@ -139,69 +421,303 @@ class Bot(Client):
     @hook
     def _001_command(self, msg):
         self.server = msg.source
-        self.nick = msg.param[0]
+        self.isupport = {}
+        self.userhost = None
+        self.set_userhost(msg.param[0])
+
+        mask = msg.param[-1].split()[-1] if msg.param[-1].strip() else ''
+        nick, _, userhost = mask.partition('!')
+        if '@' in userhost and self.is_me(nick):
+            self.set_userhost(userhost=userhost)
+
+
+    @hook
+    def _005_command(self, msg):
+        for token in msg.param[1:-1]:
+            if token.startswith('-'):
+                self.isupport.pop(token[1:].upper(), None)
+                continue
+            name, _, value = token.partition('=')
+            self.isupport[name.upper()] = value
+
+            if name.upper() == 'CASEMAPPING':
+                self.set_casemapping(value)
+            elif name.upper() == 'PREFIX':
+                self.set_prefix(value)
+            elif name.upper() == 'TARGMAX':
+                self.set_targmax(value)
+
+        self.wraplens.clear()
+
+
+    @hook
+    def _396_command(self, msg):
+        if self.userhost and len(msg.param) > 2:
+            user = self.userhost.partition('@')[0]
+            self.set_userhost(userhost='%s@%s' % (user, msg.param[1]))
+
+
+    @hook
+    def chghost_command(self, msg):
+        if self.is_me(msg.source) and len(msg.param) > 1:
+            self.set_userhost(userhost='%s@%s' % (msg.param[0], msg.param[1]))
 
 
     @hook
     def _353_command(self, msg):
-        channel = msg.param[2].lower()
-        if channel in self.channels and self.channels[channel]['joined']:
-            #if 'nicks' not in self.channels[channel]:
-            #    self.channels[channel]['nicks'] = set()
-            nicks = self.channels[channel]['nicks']
-            for nick in msg.param[-1].split():
-                if nick.startswith(('~', '&', '@', '%', '+')):
-                    nicks.add(nick[1:])
-                else:
-                    nicks.add(nick)
+        channel = self.channels.get(self.lower(msg.param[-2]))
+        if not channel or not channel.joined:
+            return
+
+        symbols = self.prefix_symbols
+        for name in msg.param[-1].split():
+            modes = 0
+            while name and name[0] in symbols:
+                modes |= symbols[name[0]]
+                name = name[1:]
+            nick, _, host = name.partition('@')
+            nick, _, username = nick.partition('!')
+            user = self.add_member(channel, nick, modes)
+            if host:
+                user.user, user.host = username, host
 
 
     @hook
     def join_command(self, msg):
-        channel = msg.param[0].lower()
-        if msg.source == self.nick:
-            if channel not in self.channels:
-                self.channels[channel] = {}
-            self.channels[channel]['name'] = msg.param[0]
-            self.channels[channel]['joined'] = True
-        elif channel in self.channels:
-            self.channels[channel]['nicks'].add(msg.source)
+        key = self.lower(msg.param[0])
+        if self.is_me(msg.source):
+            userhost = '%s@%s' % (msg.user, msg.host)
+            if msg.host and userhost != self.userhost:
+                self.set_userhost(msg.source, userhost)
+            channel = self.channels.get(key)
+            if not channel:
+                channel = self.channels[key] = Channel(msg.param[0])
+            channel.name = msg.param[0]
+            channel.joined = True
+            self.clear_channel(channel)
+        elif key in self.channels:
+            user = self.add_member(self.channels[key], msg.source)
+            user.user, user.host = msg.user, msg.host
 
 
     @hook
     def kick_command(self, msg):
-        channel = msg.param[0].lower()
-        if msg.param[1] == self.nick:
-            if channel in self.channels:
-                self.channels[channel]['joined'] = False
-                if 'nicks' in self.channels[channel]:
-                    self.channels[channel]['nicks'].clear()
-        elif channel in self.channels:
-            self.channels[channel]['nicks'].remove(msg.source)
+        channel = self.channels.get(self.lower(msg.param[0]))
+        if not channel:
+            return
+        if self.is_me(msg.param[1]):
+            channel.joined = False
+            self.clear_channel(channel)
+        else:
+            self.remove_member(channel, msg.param[1])
+
+
+    @hook
+    def mode_command(self, msg):
+        channel = self.channels.get(self.lower(msg.param[0]))
+        if not channel or len(msg.param) < 2:
+            return
+
+        chanmodes = self.isupport.get('CHANMODES', 'b,k,l,').split(',')
+        always = ''.join(chanmodes[:2])
+        when_set = chanmodes[2] if len(chanmodes) > 2 else ''
+
+        args = msg.param[2:]
+        adding = True
+        for mode in msg.param[1]:
+            if mode in '+-':
+                adding = mode == '+'
+            elif mode in self.prefix_modes:
+                if not args:
+                    break
+                key = self.lower(args.pop(0))
+                if key not in channel.members:
+                    continue
+                bits = channel.modes.get(key, 0)
+                if adding:
+                    bits |= self.prefix_modes[mode]
+                else:
+                    bits &= ~self.prefix_modes[mode]
+                if bits:
+                    channel.modes[key] = bits
+                else:
+                    channel.modes.pop(key, None)
+            elif mode in always or (adding and mode in when_set):
+                if args:
+                    args.pop(0)
 
 
     @hook
     def nick_command(self, msg):
-        new_nick = msg.param[0].lower()
-        if msg.source == self.nick:
-            self.nick = new_nick
-        for _, props in list(self.channels.items()):
-            if 'nicks' in props and msg.source in props['nicks']:
-                props['nicks'].remove(msg.source)
-                props['nicks'].add(new_nick)
+        new_nick = msg.param[0]
+        if self.is_me(msg.source):
+            self.set_userhost(new_nick)
+
+        user = self.users.pop(self.lower(msg.source), None)
+        if not user:
+            return
+
+        old_key = user.key
+        user.key = self.lower(new_nick)
+        user.nick = new_nick
+        self.users[user.key] = user
+        for channel in user.channels:
+            del channel.members[old_key]
+            channel.members[user.key] = user
+            if old_key in channel.modes:
+                channel.modes[user.key] = channel.modes.pop(old_key)
 
 
     @hook
     @priority(0)
     def part_command(self, msg):
-        channel = msg.param[0].lower()
-        if msg.source == self.nick:
-            if channel in self.channels:
-                self.channels[channel]['joined'] = False
-                if 'nicks' in self.channels[channel]:
-                    self.channels[channel]['nicks'].clear()
-        elif channel in self.channels:
-            self.channels[channel]['nicks'].remove(msg.source)
+        channel = self.channels.get(self.lower(msg.param[0]))
+        if not channel:
+            return
+        if self.is_me(msg.source):
+            channel.joined = False
+            self.clear_channel(channel)
+        else:
+            self.remove_member(channel, msg.source)
+
+
+    def forget_user(self, nick):
+        user = self.users.pop(self.lower(nick), None)
+        if not user:
+            return None
+        for channel in user.channels:
+            del channel.members[user.key]
+            channel.modes.pop(user.key, None)
+        return user
+
+
+    def find_batch(self, msg, kind):
+        if not msg.tagstr:
+            return None
+        ref = msg.tags.get('batch')
+        if ref in self.batches and self.batches[ref][0] == kind:
+            return ref
+        return None
+
+
+    def line_received(self, line):
+        if ' QUIT :' in line and self.split_quit(line):
+            return
+        Client.line_received(self, line)
+
+
+    def split_quit(self, line):
+        match = split_quit_re.match(line)
+        if not match:
+            return False
+
+        tagstr, nick, reason = match.groups()
+        if tagstr:
+            ref = parse_tags(tagstr).get('batch')
+            if ref in self.batches and self.batches[ref][0] == 'netsplit':
+                self.defer_split(ref, 'netsplit', self.batches[ref][1], nick)
+                return True
+
+        if split_re.match(reason):
+            self.defer_split(('netsplit', reason), 'netsplit', reason, nick)
+            return True
+
+        return False
+
+
+    def defer_split(self, key, kind, servers, item):
+        if key not in self.splits:
+            self.splits[key] = (kind, servers, [])
+        self.splits[key][2].append(item)
+        if not self.split_hook:
+            self.split_hook = self.set_timeout(self.flush_splits, 0)
+
+
+    def flush_splits(self):
+        if self.split_hook:
+            self.split_hook.cancel()
+            self.split_hook = None
+
+        if not self.splits:
+            return
+
+        for key, (kind, servers, items) in list(self.splits.items()):
+            if key in self.batches:
+                continue
+            del self.splits[key]
+            if kind == 'netsplit':
+                self.apply_netsplit(servers, items)
+            else:
+                self.apply_netjoin(servers, items)
+
+        if any(key not in self.batches for key in self.splits):
+            self.split_hook = self.set_timeout(self.flush_splits, 0)
+
+
+    def apply_netsplit(self, servers, nicks):
+        timestamp = time()
+        for key, (_, split_time) in list(self.split_users.items()):
+            if timestamp - split_time > self.netsplit_memory:
+                del self.split_users[key]
+
+        lost = []
+        for nick in nicks:
+            if self.forget_user(nick):
+                lost.append(nick)
+            self.split_users[self.lower(nick)] = (servers, timestamp)
+
+        self.hooks.call_event('netsplit', servers, lost)
+
+
+    def apply_netjoin(self, servers, joins):
+        nicks = []
+        for name, nick, username, host in joins:
+            self.split_users.pop(self.lower(nick), None)
+            channel = self.channels.get(self.lower(name))
+            if not channel:
+                continue
+            user = self.add_member(channel, nick)
+            user.user, user.host = username, host
+            if user.nick not in nicks:
+                nicks.append(user.nick)
+
+        self.hooks.call_event('netjoin', servers, nicks)
+
+
+    @hook
+    def batch_command(self, msg):
+        ref = msg.param[0]
+        if ref.startswith('+'):
+            kind = msg.param[1].lower() if len(msg.param) > 1 else None
+            self.batches[ref[1:]] = (kind, ' '.join(msg.param[2:]))
+        elif ref.startswith('-'):
+            if self.batches.pop(ref[1:], None):
+                self.flush_splits()
+
+
+    @hook('join')
+    @priority(1000)
+    def netjoin_join_command(self, msg):
+        join = (msg.param[0], msg.source, msg.user, msg.host)
+
+        ref = self.find_batch(msg, 'netjoin')
+        if ref:
+            self.defer_split(ref, 'netjoin', self.batches[ref][1], join)
+            return True
+
+        split = self.split_users.get(self.lower(msg.source))
+        if split and not self.is_me(msg.source):
+            self.defer_split(('netjoin', split[0]), 'netjoin', split[0], join)
+            return True
+
+        self.flush_splits()
+
+
+    @hook(('quit', 'part', 'kick', 'nick', 'mode'))
+    @priority(1000)
+    def netsplit_flush_command(self, msg):
+        if self.splits:
+            self.flush_splits()
 
 
     @hook
@@ -212,6 +728,4 @@ class Bot(Client):
     @hook
     @priority(0)
     def quit_command(self, msg):
-        for _, props in list(self.channels.items()):
-            if 'nicks' in props and msg.source in props['nicks']:
-                props['nicks'].remove(msg.source)
+        self.forget_user(msg.source)
@@ -1,20 +1,78 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
+import asyncio
 import errno
+import os
 import socket
 import ssl
+import threading
+from collections import deque
+from time import time
 
 from .interface import SelectableInterface
 
 
-class Client(SelectableInterface):
-    def __init__(self, remote, use_ssl=False):
+class SessionContext(ssl.SSLContext):
+    session = None
+
+    def wrap_socket(self, sock, **kwargs):
+        if kwargs.get('session') is None:
+            kwargs['session'] = self.session
+        return ssl.SSLContext.wrap_socket(self, sock, **kwargs)
+
+
+    def wrap_bio(self, incoming, outgoing, **kwargs):
+        if kwargs.get('session') is None:
+            kwargs['session'] = self.session
+        return ssl.SSLContext.wrap_bio(self, incoming, outgoing, **kwargs)
+
+
+    def save_session(self, sslobj):
+        if sslobj is not None and sslobj.session is not None:
+            self.session = sslobj.session
+
+
+class Client(SelectableInterface, asyncio.BufferedProtocol):
+    default_recv_buffer = 16384
+    default_flood_burst = 5
+    default_flood_cost = 2.0
+    urgent_commands = ('PONG', 'QUIT')
+    max_iovecs = 64
+    default_connect_timeout = 15.0
+    default_handshake_timeout = 15.0
+
+    def __init__(self, remote, use_ssl=False, recv_buffer=None,
+            flood_burst=None, flood_cost=None, connect_timeout=None,
+            handshake_timeout=None):
         self.use_ssl = use_ssl
         self.remote = remote
         self.connected = False
-        self.sendbuf = b''
-        self.recvbuf = b''
+        self.transport = None
+        self.sock = None
+        self.address = None
+        self.state = None
+        self.attempt = 0
+        self.addresses = deque()
+        self.deadline = None
+        self.want_write = False
+        self.tls_context = None
+        self.connect_timeout = connect_timeout or self.default_connect_timeout
+        self.handshake_timeout = handshake_timeout or \
+                self.default_handshake_timeout
+        self.flood_burst = flood_burst or self.default_flood_burst
+        self.flood_cost = flood_cost or self.default_flood_cost
+        self.tokens = self.flood_burst
+        self.refilled = time()
+        self.sendq = (deque(), deque())
+        self.sendbuf = deque()
+        self.sent_lines = 0
+        self.total_wait = 0
+        self.max_wait = 0
+        self.recvbuf = bytearray(recv_buffer or self.default_recv_buffer)
+        self.recvstart = 0
+        self.recvscan = 0
+        self.recvend = 0
 
 
     def fileno(self):
@@ -22,70 +80,346 @@ class Client(SelectableInterface):
 
 
     def can_read(self):
+        if self.state == 'handshaking':
+            return not self.want_write
         return self.connected
 
 
     def can_write(self):
+        if self.state == 'connecting':
+            return True
+        if self.state == 'handshaking':
+            return self.want_write
         return self.connected and bool(self.sendbuf)
 
 
     def do_write(self):
+        if self.state == 'connecting':
+            self._connected()
+            return
+        if self.state == 'handshaking':
+            self._handshake()
+            return
         if not self.connected:
             return
 
-        n = self._write(self.sendbuf)
-        self.sendbuf = self.sendbuf[n:]
+        buffers = list(self.sendbuf)[:self.max_iovecs]
+        n = self._write(buffers)
+        if not n:
+            return
 
+        for data in buffers:
+            if len(data) > n:
+                self.sendbuf[0] = data[n:]
+                break
+            self.sendbuf.popleft()
+            n -= len(data)
 
-    def do_read(self):
-        if not self.connected:
+        if not self.sendbuf:
+            self.core.update_selectable(self)
+
+
+    def next_tick(self):
+        if self.state:
+            return self.deadline
+        if not self.connected or not self.sendq[1]:
+            return None
+        return self.refilled + (1 - self.tokens) * self.flood_cost
+
+
+    def do_tick(self, timestamp):
+        if self.state:
+            if self.deadline is not None and timestamp >= self.deadline:
+                if self.state == 'resolving':
+                    self._connect_failed('name resolution timed out')
+                elif self.state == 'connecting':
+                    self._next_address('connect timed out')
+                else:
+                    self._next_address('TLS handshake timed out')
             return
 
-        data = self._read()
+        self.flush()
 
-        if not data:
-            self.disconnect()
+
+    def do_read(self):
+        if self.state == 'handshaking':
+            self._handshake()
             return
 
-        self.recvbuf += data
+        while self.connected:
+            n = self._read_into(self.get_buffer(-1))
+            if n is None:
+                return
 
-        if self.use_ssl:
-            data_left = self.sock.pending()
-            while data_left:
-                self.recvbuf += self._read(data_left)
-                data_left = self.sock.pending()
+            if not n:
+                self.disconnect()
+                return
+
+            self.buffer_updated(n)
+
+            if not self.use_ssl or not self.sock.pending():
+                return
+
+
+    def connection_made(self, transport):
+        self.state = None
+        self.transport = transport
+        self.connected = True
+        self.recvstart = self.recvscan = self.recvend = 0
+        self.tokens = self.flood_burst
+        self.refilled = time()
+        self.flush()
+        self.core.update_selectable(self)
+        self.hooks.call_event('connect')
 
-        parts = self.recvbuf.split(b'\r\n')
-        lines, self.recvbuf = parts[:-1], parts[-1]
+
+    def get_buffer(self, sizehint):
+        if self.recvend == len(self.recvbuf):
+            if self.recvstart:
+                n = self.recvend - self.recvstart
+                self.recvbuf[:n] = self.recvbuf[self.recvstart:self.recvend]
+                self.recvscan -= self.recvstart
+                self.recvstart = 0
+                self.recvend = n
+            else:
+                self.recvbuf.extend(bytes(len(self.recvbuf)))
+        return memoryview(self.recvbuf)[self.recvend:]
+
+
+    def buffer_updated(self, nbytes):
+        self.recvend += nbytes
+        i = self.recvbuf.rfind(b'\n', self.recvscan, self.recvend)
+        if i < 0:
+            self.recvscan = self.recvend
+            return
+
+        lines = self.recvbuf[self.recvstart:i].split(b'\n')
+        if i + 1 == self.recvend:
+            self.recvstart = self.recvscan = self.recvend = 0
+        else:
+            self.recvstart = self.recvscan = i + 1
 
         for line in lines:
+            line = line.rstrip(b'\r')
             try:
                 line = line.decode('utf-8')
             except UnicodeDecodeError:
                 line = line.decode('latin-1')
-            self.hooks.call_event('recv', line)
+            self.line_received(line)
+
+
+    def line_received(self, line):
+        self.hooks.call_event('recv', line)
+
+
+    def connection_lost(self, exc):
+        if self.transport and self.tls_context:
+            self.tls_context.save_session(
+                    self.transport.get_extra_info('ssl_object'))
+        self.transport = None
+        self.connected = False
+        for lane in self.sendq:
+            lane.clear()
+        self.sendbuf.clear()
+        self.hooks.call_event('disconnect')
+        self.core.wakeup()
+
+
+    def ssl_context(self):
+        if not self.tls_context:
+            self.tls_context = SessionContext(ssl.PROTOCOL_TLS_CLIENT)
+            self.tls_context.check_hostname = False
+            self.tls_context.verify_mode = ssl.CERT_NONE
+        return self.tls_context
 
 
     def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.connected or self.state:
+            return
+
+        self.attempt += 1
+        if self.core.loop:
+            self.state = 'connecting'
+            self.core.spawn(self.connect_async(self.attempt))
+            return
+
+        self.state = 'resolving'
+        self.deadline = time() + self.connect_timeout
+        threading.Thread(target=self._resolve, args=(self.attempt,),
+                name='%s-resolve' % self.remote[0], daemon=True).start()
+        self.core.wakeup(self.deadline)
+
+
+    async def connect_async(self, attempt):
+        kwargs = {'happy_eyeballs_delay': 0.25}
         if self.use_ssl:
-            self.sock = ssl.wrap_socket(self.sock)
-        self.sock.setblocking(0)
-        self.sock.settimeout(15)
-        self.sock.connect(self.remote)
-        self.connected = True
-        self.hooks.call_event('connect')
+            kwargs['ssl'] = self.ssl_context()
+            kwargs['ssl_handshake_timeout'] = self.handshake_timeout
+
+        def factory():
+            if attempt != self.attempt:
+                return asyncio.Protocol()
+            return self
+
+        try:
+            transport, protocol = await asyncio.wait_for(
+                    self.core.loop.create_connection(factory, *self.remote,
+                            **kwargs),
+                    self.connect_timeout + self.handshake_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            if attempt == self.attempt:
+                self._connect_failed(str(e) or 'timed out')
+            return
+
+        if protocol is not self:
+            transport.close()
+
+
+    def _resolve(self, attempt):
+        try:
+            addresses = socket.getaddrinfo(self.remote[0], self.remote[1], 0,
+                    socket.SOCK_STREAM)
+            error = None
+        except OSError as e:
+            addresses = []
+            error = e
+        self.core.call_soon_threadsafe(self._resolved, attempt, addresses,
+                error)
+
+
+    def _resolved(self, attempt, addresses, error):
+        if attempt != self.attempt or self.state != 'resolving':
+            return
+
+        if not addresses:
+            self._connect_failed(error or 'no addresses found')
+            return
+
+        self.addresses.extend(addresses)
+        self._next_address(None)
+
+
+    def _next_address(self, error):
+        if error and self.addresses:
+            print('connection to %s:%d failed: %s' % (self.address[:2] +
+                    (error,)))
+        self._close_socket()
+
+        while self.addresses:
+            family, socktype, proto, _, address = self.addresses.popleft()
+            try:
+                sock = socket.socket(family, socktype, proto)
+                sock.setblocking(False)
+                err = sock.connect_ex(address)
+            except OSError as e:
+                error = e
+                continue
+
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sock.close()
+                error = os.strerror(err)
+                continue
+
+            self.sock = sock
+            self.address = address
+            self.state = 'connecting'
+            self.deadline = time() + self.connect_timeout
+            self.core.update_selectable(self)
+            self.core.wakeup(self.deadline)
+            return
+
+        self._connect_failed(error or 'no usable addresses')
+
+
+    def _connected(self):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self._next_address(os.strerror(err))
+            return
+
+        if not self.use_ssl:
+            self._established()
+            return
+
+        self.sock = self.ssl_context().wrap_socket(self.sock,
+                server_hostname=self.remote[0], do_handshake_on_connect=False)
+        self.state = 'handshaking'
+        self.deadline = time() + self.handshake_timeout
+        self.core.wakeup(self.deadline)
+        self._handshake()
+
+
+    def _handshake(self):
+        try:
+            self.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self.want_write = False
+            self.core.update_selectable(self)
+            return
+        except ssl.SSLWantWriteError:
+            self.want_write = True
+            self.core.update_selectable(self)
+            return
+        except (ssl.SSLError, OSError) as e:
+            self._next_address(e)
+            return
+
+        self._established()
+
+
+    def _established(self):
+        self.state = None
+        self.deadline = None
+        self.want_write = False
+        self.addresses.clear()
+        self.connection_made(None)
+
+
+    def _connect_failed(self, error):
+        print('connection to %s:%d failed: %s' % (self.remote + (error,)))
+        self._close_socket()
+        self.state = None
+        self.deadline = None
+        self.want_write = False
+        self.addresses.clear()
+        self.hooks.call_event('disconnect')
+
+
+    def _close_socket(self):
+        if self.sock:
+            if isinstance(self.sock, ssl.SSLSocket) and not self.state:
+                self.tls_context.save_session(self.sock)
+            self.core.update_selectable(self, 0)
+            self.sock.close()
+            self.sock = None
 
 
     def disconnect(self):
-        self.sock.close()
+        if self.transport:
+            self.transport.close()
+            return
+
+        if self.state:
+            self.attempt += 1
+            self._connect_failed('aborted')
+            return
+
+        if not self.connected:
+            return
+
         self.connected = False
-        self.hooks.call_event('disconnect')
+        self._close_socket()
+        self.connection_lost(None)
 
 
-    def _write(self, data):
+    def _write(self, buffers):
         try:
-            n = self.sock.send(data)
+            if self.use_ssl or not hasattr(self.sock, 'sendmsg'):
+                n = self.sock.send(b''.join(buffers))
+            else:
+                n = self.sock.sendmsg(buffers)
+        except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
         except socket.error as e:
             if e.errno == errno.ECONNRESET:
                 self.disconnect()
@@ -102,9 +436,11 @@ class Client(SelectableInterface):
         return n
 
 
-    def _read(self, bufsize=1024):
+    def _read_into(self, buf):
         try:
-            data = self.sock.recv(bufsize)
+            return self.sock.recv_into(buf)
+        except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
         except socket.error as e:
             if e.errno == errno.ECONNRESET:
                 self.disconnect()
@@ -118,9 +454,57 @@ class Client(SelectableInterface):
             if e.errno == ssl.SSL_ERROR_WANT_WRITE:
                 return
             raise
-        return data
 
 
     def send(self, line):
         self.hooks.call_event('send', line)
-        self.sendbuf += line.encode('utf-8') + b'\r\n'
+        urgent = line.split(' ', 1)[0].upper() in self.urgent_commands
+        lane = self.sendq[0 if urgent else 1]
+        lane.append((line.encode('utf-8') + b'\r\n', time()))
+        self.flush()
+
+
+    def flush(self):
+        if not self.connected:
+            return
+
+        timestamp = time()
+        self.tokens = min(self.flood_burst, self.tokens +
+                (timestamp - self.refilled) / self.flood_cost)
+        self.refilled = timestamp
+
+        lines = []
+        urgent, bulk = self.sendq
+        while urgent or (bulk and self.tokens >= 1):
+            data, queued = (urgent or bulk).popleft()
+            self.tokens -= 1
+            wait = timestamp - queued
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            lines.append(data)
+
+        self.sent_lines += len(lines)
+
+        if bulk:
+            self.core.wakeup(self.next_tick())
+
+        if not lines:
+            return
+
+        if self.transport:
+            self.transport.writelines(lines)
+            return
+
+        flip = not self.sendbuf
+        self.sendbuf.extend(lines)
+        if flip:
+            self.core.update_selectable(self)
+
+
+    def queue_stats(self):
+        return {
+            'sendq': len(self.sendq[0]) + len(self.sendq[1]),
+            'sent': self.sent_lines,
+            'wait_avg': round(self.total_wait / (self.sent_lines or 1), 3),
+            'wait_max': round(self.max_wait, 3),
+        }
@@ -1,26 +1,103 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
+import os
+import pickle
 from collections import OrderedDict
+from types import MappingProxyType
 
-from .yaml import yaml
 
+CACHE_VERSION = 1
 
 config = OrderedDict()
+stamp = None
+snapshots = {}
+use_cache = False
+
+
+def plain(value):
+    if isinstance(value, dict):
+        return OrderedDict((key, plain(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType(OrderedDict((key, freeze(item))
+                for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def parse(path):
+    from .yaml import yaml
+
+    with open(path) as f:
+        return plain(yaml.load(f)) or OrderedDict()
+
+
+def read_cache(path, key):
+    try:
+        with open(path, 'rb') as f:
+            version, cached_key, data = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.PickleError):
+        return None
+    if version != CACHE_VERSION or cached_key != key:
+        return None
+    return data
+
+
+def write_cache(path, key, data):
+    temp = '%s.%d' % (path, os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            pickle.dump((CACHE_VERSION, key, data), f,
+                    pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except OSError:
+        print('config: unable to write parse cache %s' % path)
+
 
 def load(core):
-    global config
+    global config, stamp, snapshots
+
+    st = os.stat(core.config_path)
+    key = (core.config_path, st.st_mtime_ns, st.st_size)
+    if key == stamp:
+        return False
 
-    with open(core.config_path) as f:
-        config = yaml.load(f)
+    data = None
+    if use_cache:
+        cache_path = os.path.join(core.data_path, 'config.cache')
+        data = read_cache(cache_path, key)
+    if data is None:
+        data = parse(core.config_path)
+        if use_cache:
+            write_cache(cache_path, key, data)
 
+    config = data
+    stamp = key
+    snapshots = {}
+    return True
 
-def autoload_list(bot):
-    global config
+
+def network(name):
+    try:
+        return snapshots[name]
+    except KeyError:
+        snapshot = snapshots[name] = freeze(config.get(name) or {})
+        return snapshot
+
+
+def autoload_list(bot, snapshot=None):
+    if snapshot is None:
+        snapshot = bot.config
 
     plugins = ['base']
-    for name, options in config[bot.network].get('plugins',
-            OrderedDict()).items():
+    for name, options in snapshot.get('plugins', {}).items():
         if name not in plugins and \
                 (not options or options.get('autoload', True)):
             plugins.append(name)
@@ -28,9 +105,7 @@ def autoload_list(bot):
 
 
 def plugin_options(bot, plugin):
-    global config
-
-    plugin = config[bot.network].get('plugins', OrderedDict()).get(plugin)
+    plugin = network(bot.network).get('plugins', {}).get(plugin)
     if plugin:
         return plugin
-    return OrderedDict()
+    return MappingProxyType(OrderedDict())
@@ -2,33 +2,149 @@
 # vim: set ts=4 et
 
 import os
-from select import select
+import selectors
+import socket
+import traceback
+from collections import deque
 from time import time
 
-import reloader
-
 from . import config
 from .bot import Bot
+from .interface import SelectableInterface
+from .watcher import ConfigWatcher
 
 
-class Core(object):
+class Waker(SelectableInterface):
     def __init__(self):
+        self.rsock, self.wsock = socket.socketpair()
+        self.rsock.setblocking(False)
+        self.wsock.setblocking(False)
+        self.pending = deque()
+
+
+    def fileno(self):
+        return self.rsock.fileno()
+
+
+    def can_read(self):
+        return True
+
+
+    def do_read(self):
+        try:
+            while self.rsock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while self.pending:
+            fn, args = self.pending.popleft()
+            try:
+                fn(*args)
+            except:
+                print('callback error:')
+                traceback.print_exc()
+
+
+    def call_soon(self, fn, *args):
+        self.pending.append((fn, args))
+        try:
+            self.wsock.send(b'\0')
+        except BlockingIOError:
+            pass
+
+
+class Link(SelectableInterface):
+    def __init__(self, core, conn):
+        self.core = core
+        self.conn = conn
+        self.closed = False
+
+
+    def fileno(self):
+        return self.conn.fileno()
+
+
+    def can_read(self):
+        return not self.closed
+
+
+    def do_read(self):
+        try:
+            while not self.closed and self.conn.poll():
+                self.dispatch(*self.conn.recv())
+        except (EOFError, OSError):
+            self.core.update_selectable(self, 0)
+            self.closed = True
+            self.core._shutdown('supervisor exited')
+
+
+    def dispatch(self, command, *args):
+        if command == 'reload':
+            self.core.networks = args[0]
+            self.core._reload()
+        elif command == 'shutdown':
+            self.core._shutdown(*args)
+        elif command == 'stats':
+            self.send('stats', self.core.stats())
+
+
+    def send(self, *message):
+        if not self.closed:
+            self.conn.send(message)
+
+
+class Core(object):
+    loop = None
+
+    def __init__(self, networks=None, link=None, watch=False,
+            production=False):
+        self.networks = networks
+        self.production = production
+        self.link = None
         self.bots = {}
         self.selectable = []
+        self.selector = selectors.DefaultSelector()
+        self.events = {}
+        self.waker = Waker()
+        self.update_selectable(self.waker)
+        if link:
+            self.link = Link(self, link)
+            self.update_selectable(self.link)
         self.running = False
         self.in_shutdown = False
+        self.shared_plugins = {}
 
         self.init_paths()
-        reloader.enable(blacklist=['bot', 'client', 'core', 'decorators',
-                'hook', 'interface', 'message', 'plugin'])
-        self.reload()
+        if not production:
+            import reloader
+            reloader.enable(blacklist=['aio', 'bot', 'client', 'core',
+                    'decorators', 'hook', 'interface', 'message',
+                    'permissions', 'plugin', 'supervisor', 'watcher'])
+        self._reload()
+
+        self.watcher = None
+        if watch:
+            self.watcher = ConfigWatcher(self, self.config_path)
+            self.selectable.append(self.watcher)
+            if self.watcher.fd is not None:
+                self.update_selectable(self.watcher)
 
 
     def reload(self):
+        if self.link:
+            self.link.send('reload')
+            return
+
+        self._reload()
+
+
+    def _reload(self):
         config.load(self)
 
         current_bots = self.bots.keys()
-        new_bots = config.config.keys()
+        new_bots = [network for network in config.config.keys() \
+                if self.networks is None or network in self.networks]
 
         remove = [network for network in self.bots.keys() \
                 if network not in new_bots]
@@ -41,6 +157,13 @@ class Core(object):
         for network in add:
             self.add_bot(network)
 
+        for network in add:
+            self.bots[network].connect()
+
+        for network in new_bots:
+            if network not in add:
+                self.bots[network].reconfigure()
+
 
     def init_paths(self):
         self.root = os.path.dirname(os.path.abspath(__file__))
@@ -59,6 +182,41 @@ class Core(object):
     def remove_bot(self, network):
         bot = self.bots[network]
         self.selectable.remove(bot)
+        self.update_selectable(bot, 0)
+
+
+    def update_selectable(self, obj, events=None):
+        if events is None:
+            events = 0
+            if obj.can_read():
+                events |= selectors.EVENT_READ
+            if obj.can_write():
+                events |= selectors.EVENT_WRITE
+
+        current = self.events.get(obj, 0)
+        if events == current:
+            return
+
+        if not current:
+            self.selector.register(obj, events)
+        elif not events:
+            self.selector.unregister(obj)
+        else:
+            self.selector.modify(obj, events)
+
+        if events:
+            self.events[obj] = events
+        else:
+            del self.events[obj]
+
+
+    def next_timeout(self):
+        timestamps = [obj.next_tick() for obj in self.selectable]
+        timestamps = [timestamp for timestamp in timestamps
+                if timestamp is not None]
+        if not timestamps:
+            return None
+        return max(0, min(timestamps) - time())
 
 
     def run(self):
@@ -79,25 +237,66 @@ class Core(object):
 
 
     def tick(self):
+        ready = self.selector.select(self.next_timeout())
+
+        for key, events in ready:
+            if events & selectors.EVENT_READ:
+                key.fileobj.do_read()
+
+        for key, events in ready:
+            if events & selectors.EVENT_WRITE:
+                key.fileobj.do_write()
+
+        self.run_timers()
+
+
+    def run_timers(self):
         timestamp = time()
         for obj in self.selectable:
-            obj.do_tick(timestamp)
+            next_tick = obj.next_tick()
+            if next_tick is not None and next_tick <= timestamp:
+                obj.do_tick(timestamp)
+
+
+    def wakeup(self, timestamp=None):
+        pass
 
-        read_objs = (obj for obj in self.selectable if obj.can_read())
-        write_objs = (obj for obj in self.selectable if obj.can_write())
 
-        readable, writeable, _ = select(read_objs, write_objs, [], 0.25)
+    def call_soon_threadsafe(self, fn, *args):
+        self.waker.call_soon(fn, *args)
 
-        for obj in readable:
-            obj.do_read()
 
-        for obj in writeable:
-            obj.do_write()
+    def spawn(self, coro):
+        coro.close()
+        print('coroutine %s skipped: async hooks need the asyncio core '
+              '(--asyncio)' % coro.__qualname__)
+
+
+    def stats(self):
+        stats = {}
+        for network, bot in self.bots.items():
+            stats[network] = {
+                'connected': bot.connected,
+                'plugins': len(bot.plugins.list()),
+                'timers': len(bot.hooks.timestamp_hooks) -
+                        bot.hooks.cancelled_timestamps,
+            }
+            stats[network].update(bot.queue_stats())
+        return stats
 
 
     def shutdown(self, reason=''):
+        if self.link:
+            self.link.send('shutdown', reason)
+            return
+
+        self._shutdown(reason)
+
+
+    def _shutdown(self, reason=''):
         if self.in_shutdown:
             self.running = False
+            self.wakeup()
             return
 
         self.in_shutdown = True
@@ -105,3 +304,5 @@ class Core(object):
         for obj in self.selectable:
             if obj.connected and isinstance(obj, Bot):
                 obj.hooks.call_event('shutdown', reason)
+
+        self.wakeup()
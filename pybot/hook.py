@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
-import bisect
+import asyncio
+import heapq
 import inspect
+import itertools
 import re
 import traceback
+import types
 
 from .message import Message
 
@@ -15,6 +18,34 @@ url_re = re.compile(
 
 domain_re = re.compile('https?://(?:www\.)?([^ /]+\.[^ /]+)')
 
+word_re = re.compile('\S+')
+
+
+def hook_registry(cls):
+    registry = cls.__dict__.get('_hook_registry')
+    if registry is not None:
+        return registry
+
+    functions = {}
+    for klass in reversed(cls.__mro__):
+        functions.update(vars(klass))
+
+    registry = []
+    for name, fn in sorted(functions.items()):
+        if not inspect.isfunction(fn) or not hasattr(fn, '_hooks'):
+            continue
+        nargs = fn.__code__.co_argcount - 1
+        level = getattr(fn, '_level', getattr(cls, 'default_level', 1))
+        priority = getattr(fn, '_priority',
+                getattr(cls, 'default_priority', 500))
+        for hook in fn._hooks:
+            registry.append((hook, fn, nargs, level, priority))
+
+    registry = tuple(registry)
+    cls._hook_registry = registry
+    return registry
+
+
 class Hook(object):
     def __init__(self, sort, extra={}):
         self.sort = sort
@@ -60,6 +91,22 @@ class Hook(object):
             self.__func__._level = getattr(self.owner, 'default_level', 1)
 
 
+    def bound_copy(self, owner, fn, nargs, level, priority):
+        hook = object.__new__(type(self))
+        hook.__dict__.update(self.__dict__)
+        hook.priority = priority
+        hook.rebind(owner, fn, nargs, level)
+        return hook
+
+
+    def rebind(self, owner, fn, nargs, level):
+        self.owner = owner
+        self.fn = types.MethodType(fn, owner)
+        self.__func__ = fn
+        self.nargs = nargs
+        self.level = level
+
+
 class EventHook(Hook):
     def __init__(self, event):
         Hook.__init__(self, event)
@@ -82,6 +129,13 @@ class TriggerHook(Hook):
 class TimestampHook(Hook):
     def __init__(self, timestamp, extra={}):
         Hook.__init__(self, timestamp, extra)
+        self.manager = None
+        self.entry = None
+
+
+    def cancel(self):
+        if self.manager:
+            self.manager.uninstall(self)
 
 
 class UrlHook(Hook):
@@ -89,14 +143,30 @@ class UrlHook(Hook):
         Hook.__init__(self, domain)
 
 
+class TriggerNode(object):
+    __slots__ = ('children', 'hooks')
+
+    def __init__(self):
+        self.children = {}
+        self.hooks = ()
+
+
 class HookManager:
     def __init__(self, bot):
         self.bot = bot
-        self.event_hooks = []
-        self.command_hooks = []
-        self.trigger_hooks = []
+        self.event_hooks = {}
+        self.command_hooks = {}
+        self.trigger_hooks = {}
         self.timestamp_hooks = []
-        self.url_hooks = []
+        self.url_hooks = {}
+        self.trigger_trie = TriggerNode()
+        self.timestamp_count = itertools.count()
+        self.cancelled_timestamps = 0
+
+        self.tables = {EventHook: self.event_hooks,
+                       CommandHook: self.command_hooks,
+                       TriggerHook: self.trigger_hooks,
+                       UrlHook: self.url_hooks}
 
 
     def install(self, hook):
@@ -110,126 +180,168 @@ class HookManager:
         default_level = getattr(hook.owner, 'default_level', 1)
         hook.priority = getattr(hook.fn, '_priority', default_priority)
         hook.level = getattr(hook.fn, '_level', default_level)
+        self._add(hook)
 
-        d = {EventHook: self.event_hooks,
-             CommandHook: self.command_hooks,
-             TriggerHook: self.trigger_hooks,
-             TimestampHook: self.timestamp_hooks,
-             UrlHook: self.url_hooks}
 
-        l = d.get(type(hook), None)
+    def _add(self, hook):
+        if type(hook) == TimestampHook:
+            self._schedule(hook)
+            self.bot.core.wakeup(hook.sort)
+            return
+
+        table = self.tables.get(type(hook), None)
 
-        if l == None:
+        if table == None:
             raise Exception('unsupported hook class: %s' % type(hook))
 
-        bisect.insort_right(l, hook)
+        hooks = table.get(hook.sort, ()) + (hook,)
+        table[hook.sort] = tuple(sorted(hooks, key=lambda h: -h.priority))
+
+        if table is self.trigger_hooks:
+            self._index_trigger(hook.sort)
+
+
+    def _schedule(self, hook):
+        hook.manager = self
+        hook.entry = [hook.sort, next(self.timestamp_count), hook]
+        heapq.heappush(self.timestamp_hooks, hook.entry)
 
 
     def install_owner(self, owner):
-        for _, method in inspect.getmembers(owner, inspect.ismethod):
-            hooks = getattr(method.__func__, '_hooks', [])
-            for hook in hooks:
-                hook.bind(method, owner)
-                self.install(hook)
+        for hook, fn, nargs, level, priority in hook_registry(type(owner)):
+            self._add(hook.bound_copy(owner, fn, nargs, level, priority))
 
 
     def uninstall(self, hook):
-        d = {EventHook: self.event_hooks,
-             CommandHook: self.command_hooks,
-             TriggerHook: self.trigger_hooks,
-             TimestampHook: self.timestamp_hooks,
-             UrlHook: self.url_hooks}
+        if type(hook) == TimestampHook:
+            if hook.entry:
+                hook.entry[2] = None
+                hook.entry = None
+                self.cancelled_timestamps += 1
+                self._compact_timestamps()
+            return
 
-        l = d.get(type(hook), [])
+        table = self.tables.get(type(hook), {})
 
-        l.remove(hook)
+        hooks = tuple(h for h in table.get(hook.sort, ()) if h is not hook)
+        if hooks:
+            table[hook.sort] = hooks
+        else:
+            table.pop(hook.sort, None)
 
+        if table is self.trigger_hooks:
+            self._index_trigger(hook.sort)
 
-    def uninstall_owner(self, owner):
-        for l in [self.event_hooks,
-                  self.command_hooks,
-                  self.trigger_hooks,
-                  self.timestamp_hooks,
-                  self.url_hooks]:
 
-            l[:] = (h for h in l if h.owner != owner)
+    def _index_trigger(self, key):
+        words = key[1:]
+        path = [self.trigger_trie]
+        for word in words:
+            path.append(path[-1].children.setdefault(word, TriggerNode()))
+        path[-1].hooks = self.trigger_hooks.get(key, ())
 
+        for depth in range(len(words), 0, -1):
+            if path[depth].hooks or path[depth].children:
+                break
+            del path[depth - 1].children[words[depth - 1]]
 
-    def find(self, model):
-        d = {EventHook: self.event_hooks,
-             CommandHook: self.command_hooks,
-             TriggerHook: self.trigger_hooks,
-             TimestampHook: self.timestamp_hooks,
-             UrlHook: self.url_hooks}
 
-        l = d.get(type(model), [])
+    def _compact_timestamps(self):
+        heap = self.timestamp_hooks
+        if self.cancelled_timestamps < 64 or \
+                self.cancelled_timestamps < len(heap) // 2:
+            return
 
-        if isinstance(model, TimestampHook):
-            left = 0
-        else:
-            left = bisect.bisect_left(l, model)
+        heap[:] = (entry for entry in heap if entry[2])
+        heapq.heapify(heap)
+        self.cancelled_timestamps = 0
 
-        right = bisect.bisect_right(l, model)
 
-        hook_seq = l[left:right]
-        hook_seq.sort(key=lambda h: -h.fn._priority)
-        return hook_seq
+    def uninstall_owner(self, owner):
+        for table in self.tables.values():
+            for key, hooks in list(table.items()):
+                if not any(h.owner == owner for h in hooks):
+                    continue
+                hooks = tuple(h for h in hooks if h.owner != owner)
+                if hooks:
+                    table[key] = hooks
+                else:
+                    del table[key]
+
+                if table is self.trigger_hooks:
+                    self._index_trigger(key)
+
+        self._cancel_timers(owner)
+
+
+    def rebind_owner(self, old, new):
+        prepared = {}
+        for hook, fn, nargs, level, priority in hook_registry(type(new)):
+            key = (type(hook), hook.sort, fn.__name__, priority)
+            prepared.setdefault(key, []).append((hook, fn, nargs, level))
+
+        stale = []
+        for table in self.tables.values():
+            for hooks in table.values():
+                for hook in hooks:
+                    if hook.owner != old:
+                        continue
+                    key = (type(hook), hook.sort, hook.__func__.__name__,
+                           hook.priority)
+                    if prepared.get(key):
+                        _, fn, nargs, level = prepared[key].pop(0)
+                        hook.rebind(new, fn, nargs, level)
+                    else:
+                        stale.append(hook)
+
+        for hook in stale:
+            self.uninstall(hook)
+        self._cancel_timers(old)
+
+        for (_, _, _, priority), entries in prepared.items():
+            for hook, fn, nargs, level in entries:
+                self._add(hook.bound_copy(new, fn, nargs, level, priority))
+
+
+    def _cancel_timers(self, owner):
+        hooks = [entry[2] for entry in self.timestamp_hooks
+                 if entry[2] and entry[2].owner == owner]
+        for hook in hooks:
+            self.uninstall(hook)
+
+
+    def find(self, model):
+        if isinstance(model, TimestampHook):
+            hook_seq = [entry[2] for entry in self.timestamp_hooks
+                        if entry[2] and entry[0] <= model.sort]
+            hook_seq.sort(key=lambda h: (h.sort, -h.priority))
+            return hook_seq
+
+        return self.tables.get(type(model), {}).get(model.sort, ())
 
 
     def call(self, hook_seq, *args):
         for hook in hook_seq:
-            if isinstance(hook, TimestampHook):
-                self.uninstall(hook)
-                repeat = hook.extra.get('repeat', None)
-                if repeat:
-                    hook.sort += repeat
-                    self.install(hook)
-
-            if hook(*args):
+            result = hook(*args)
+            if asyncio.iscoroutine(result):
+                self.bot.core.spawn(result)
+            elif result:
                 return True
 
 
     def call_event(self, event, *args):
-        hooks = self.find(EventHook(event))
-        self.call(hooks, *args)
+        self.call(self.event_hooks.get(event, ()), *args)
         if event == 'recv':
             msg = Message(args[0], self.bot)
-            self.call_command(msg)
+            with self.bot.batch():
+                self.call_command(msg)
 
 
     def call_command(self, msg):
-        if msg.cmd in ('NOTICE', 'PRIVMSG'):
-            self.apply_permissions(msg)
         if msg.cmd == 'PRIVMSG':
             self.process_privmsg(msg)
 
-        hooks = self.find(CommandHook(msg.cmd))
-        self.call(hooks, msg)
-
-
-    def apply_permissions(self, msg):
-        msg.permissions = {}
-        for pattern, rules in list(self.bot.allow_rules.items()):
-            regex = '^' + re.escape(pattern).replace('\\*', '.*') + '$'
-            if not re.match(regex, msg.prefix):
-                continue
-
-            for plugin, level in list(rules.items()):
-                current_level = msg.permissions.get(plugin, level)
-                msg.permissions[plugin] = max(level, current_level)
-
-        for pattern, rules in list(self.bot.deny_rules.items()):
-            regex = '^' + re.escape(pattern).replace('\\*', '.*') + '$'
-            if not re.match(regex, msg.prefix):
-                continue
-
-            for plugin, level in list(rules.items()):
-                if plugin == 'ANY':
-                    for plugin, current_level in list(msg.permissions.items()):
-                        msg.permissions[plugin] = min(level, current_level)
-                    continue
-                current_level = msg.permissions.get(plugin, level)
-                msg.permissions[plugin] = min(level, current_level)
+        self.call(self.command_hooks.get(msg.cmd, ()), msg)
 
 
     def process_privmsg(self, msg):
@@ -243,25 +355,32 @@ class HookManager:
                 self.call_url(msg, url)
 
 
+    def match_trigger(self, trigger):
+        matches = []
+        words = []
+        node = self.trigger_trie
+        for match in word_re.finditer(trigger):
+            node = node.children.get(match.group(0), None)
+            if not node:
+                break
+            words.append(match.group(0))
+            if node.hooks:
+                matches.append((node.hooks, len(words), match.end()))
+
+        for hooks, depth, end in reversed(matches):
+            yield hooks, ' '.join(words[:depth]), trigger[end:].lstrip()
+
+
     def call_trigger(self, msg):
         authorized = True
-        num_words = len(msg.trigger.split())
-        for depth in range(num_words, 0, -1):
-            parts = tuple(msg.trigger.split(None, depth))
-            hooks = self.find(TriggerHook(parts[:depth]))
-
+        for hooks, name, targstr in self.match_trigger(msg.trigger):
             n = len(hooks)
-            hooks[:] = [h for h in hooks if
-                        h.fn._level <= msg.permissions.get(h.fn.__self__.name, msg.permissions.get('ANY', 0))]
+            hooks = [h for h in hooks if self.allowed(h, msg)]
 
             if len(hooks) < n:
                 authorized = False
 
-            if not hooks:
-                pass
-
-            targstr = parts[depth] if len(parts) > depth else ''
-            targs = (' '.join(parts[:depth]),) + tuple(targstr.split())
+            targs = (name,) + tuple(targstr.split())
             if self.call(hooks, msg, targs, targstr):
                 break
 
@@ -269,9 +388,45 @@ class HookManager:
             msg.reply("You don't have permission to use that trigger")
 
 
+    def allowed(self, hook, msg):
+        return hook.level <= msg.permissions.get(hook.owner.name,
+                msg.permissions.get('ANY', 0))
+
+
+    def next_timestamp(self):
+        heap = self.timestamp_hooks
+        while heap and not heap[0][2]:
+            heapq.heappop(heap)
+            self.cancelled_timestamps -= 1
+        if heap:
+            return heap[0][0]
+        return None
+
+
     def call_timestamp(self, timestamp):
-        hooks = self.find(TimestampHook(timestamp))
-        self.call(hooks, timestamp)
+        heap = self.timestamp_hooks
+        hooks = []
+        while heap and heap[0][0] <= timestamp:
+            _, _, hook = heapq.heappop(heap)
+            if not hook:
+                self.cancelled_timestamps -= 1
+                continue
+
+            hook.entry = None
+            hooks.append(hook)
+
+        for hook in hooks:
+            repeat = hook.extra.get('repeat', None)
+            if repeat:
+                hook.sort += repeat
+                if hook.sort <= timestamp:
+                    missed = (timestamp - hook.sort) // repeat + 1
+                    hook.sort += missed * repeat
+                self._schedule(hook)
+
+        hooks.sort(key=lambda h: -h.priority)
+        for hook in hooks:
+            self.call((hook,), timestamp)
 
 
     def call_url(self, msg, url):
@@ -280,9 +435,7 @@ class HookManager:
             return
         domain = match.group(1).lower()
 
-        hooks = self.find(UrlHook(domain))
-        if self.call(hooks, msg, domain, url):
+        if self.call(self.url_hooks.get(domain, ()), msg, domain, url):
             return True
 
-        hooks = self.find(UrlHook('any'))
-        self.call(hooks, msg, domain, url)
+        self.call(self.url_hooks.get('any', ()), msg, domain, url)
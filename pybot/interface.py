@@ -25,5 +25,9 @@ class SelectableInterface(object):
         return
 
 
+    def next_tick(self):
+        return None
+
+
     def do_tick(self, time_now):
         return
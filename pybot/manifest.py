@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import importlib
+import json
+import os
+import sys
+import traceback
+
+from .hook import EventHook, CommandHook, TriggerHook, UrlHook, hook_registry
+
+
+hook_types = {EventHook: 'event', CommandHook: 'command',
+              TriggerHook: 'trigger', UrlHook: 'url'}
+
+manifest = {}
+stamp = None
+
+
+def path(core):
+    return os.path.join(core.data_path, 'manifest.json')
+
+
+def load(core):
+    global manifest, stamp
+
+    try:
+        st = os.stat(path(core))
+    except OSError:
+        manifest = {}
+        stamp = None
+        return manifest
+
+    key = (st.st_mtime_ns, st.st_size)
+    if key != stamp:
+        with open(path(core)) as f:
+            manifest = json.load(f)
+        stamp = key
+    return manifest
+
+
+def hook_key(_type, hook_name):
+    if _type == 'command':
+        return _type, hook_name.upper()
+    return _type, ' '.join(hook_name.split())
+
+
+def hooks_for(bot, name, options):
+    entry = load(bot.core).get(name)
+    if entry and entry['eager']:
+        return None
+
+    declared = options.get('hooks')
+    if not entry and not (declared and options.get('lazy') is True):
+        return None
+
+    if declared:
+        known = {}
+        if entry:
+            known = {hook_key(_type, hook_name): (level, priority)
+                     for _type, hook_name, level, priority in entry['hooks']}
+        default = (options.get('default_level', 1),
+                   options.get('default_priority', 500))
+        return [(_type, hook_name) + known.get(hook_key(_type, hook_name),
+                                                 default)
+                for _type, names in declared.items()
+                for hook_name in ([names] if isinstance(names, str)
+                                  else names)]
+
+    return [tuple(hook) for hook in entry['hooks']]
+
+
+def describe(cls):
+    hooks = []
+    eager = not getattr(cls, 'lazy', True)
+    for hook, _, _, level, priority in hook_registry(cls):
+        _type = hook_types[type(hook)]
+        if _type == 'event':
+            eager = True
+            continue
+
+        if _type == 'trigger':
+            hook_name = ' '.join(hook.sort[1:])
+        else:
+            hook_name = hook.sort
+        hooks.append((_type, hook_name, level, priority))
+    return {'eager': eager, 'hooks': hooks}
+
+
+def plugin_names(directory):
+    names = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.startswith('_'):
+            continue
+        if entry.endswith('.py'):
+            names.append(entry[:-3])
+        elif os.path.isfile(os.path.join(directory, entry, '__init__.py')):
+            names.append(entry)
+    return names
+
+
+def generate(core):
+    sys.path.insert(0, core.parent)
+    result = {}
+    for package, directory in (('pybot.plugins', core.plugin_dir),
+            ('plugins', os.path.join(core.parent, 'plugins'))):
+        if not os.path.isdir(directory):
+            continue
+        for name in plugin_names(directory):
+            try:
+                module = importlib.import_module('%s.%s' % (package, name))
+                result[name] = describe(module.Plugin)
+            except:
+                print("manifest: skipping plugin '%s'" % name)
+                traceback.print_exc()
+    return result
+
+
+def main():
+    from .core import Core
+
+    core = Core.__new__(Core)
+    core.init_paths()
+    result = generate(core)
+    with open(path(core), 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print('manifest: wrote %d plugins to %s' % (len(result), path(core)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+from string import ascii_lowercase, ascii_uppercase
+
+
+casemaps = {
+    'ascii': str.maketrans(ascii_uppercase, ascii_lowercase),
+    'rfc1459': str.maketrans(ascii_uppercase + '[]\\~',
+            ascii_lowercase + '{}|^'),
+    'strict-rfc1459': str.maketrans(ascii_uppercase + '[]\\',
+            ascii_lowercase + '{}|'),
+}
+
+
+def parse_prefix_modes(value):
+    if not value.startswith('(') or ')' not in value:
+        return '', ''
+    modes, symbols = value[1:].split(')', 1)
+    return modes, symbols[:len(modes)]
+
+
+class User(object):
+    __slots__ = ('key', 'nick', 'user', 'host', 'channels')
+
+    def __init__(self, key, nick):
+        self.key = key
+        self.nick = nick
+        self.user = None
+        self.host = None
+        self.channels = []
+
+
+class Channel(object):
+    __slots__ = ('name', 'key', 'joined', 'members', 'modes')
+
+    def __init__(self, name, key=None):
+        self.name = name
+        self.key = key
+        self.joined = False
+        self.members = {}
+        self.modes = {}
+
+
+    def nicks(self):
+        return [user.nick for user in self.members.values()]
+
+
+    def has_mode(self, key, mask):
+        return bool(self.modes.get(key, 0) & mask)
@@ -1,25 +1,11 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 et
 
-import re
 from datetime import datetime
+from time import time
 
-from . import config
 
-
-message_re = re.compile(
-  '^(?:'                            +
-    ':(?P<prefix>'                  +
-      '(?P<source>[^ !@]+)'         +
-      '(?:'                         +
-        '(?:!(?P<user>[^ @]+))?'    +
-        '@(?P<host>[^ ]+)'          +
-      ')?'                          +
-    ') '                            +
-  ')?'                              +
-  '(?P<cmd>[^ :]+)'                 +
-  '(?: (?P<params>.+))?$'
-)
+tag_escapes = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
 
 
 def parse_params(params):
@@ -36,36 +22,187 @@ def parse_params(params):
     return l
 
 
-def parse_message(message):
-    match = message_re.match(message)
-    if match:
-        d = match.groupdict()
-        d['cmd'] = d['cmd'].upper()
-        d['param'] = parse_params(d['params'])
-        del d['params']
-    else:
-        d = {'prefix': None, 'source': None, 'user': None, 'host': None,
-             'command': '', 'param': []}
-    return d
+def unescape_tag(value):
+    if '\\' not in value:
+        return value
+
+    chars = []
+    escaped = False
+    for c in value:
+        if escaped:
+            chars.append(tag_escapes.get(c, c))
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        else:
+            chars.append(c)
+    return ''.join(chars)
+
+
+def parse_tags(tagstr):
+    tags = {}
+    if not tagstr:
+        return tags
+    for tag in tagstr.split(';'):
+        if not tag:
+            continue
+        key, _, value = tag.partition('=')
+        tags[key] = unescape_tag(value)
+    return tags
+
+
+def parse_prefix(prefix):
+    if not prefix:
+        return None, None, None
+    source, _, host = prefix.partition('@')
+    source, _, user = source.partition('!')
+    return source, user or None, host or None
 
 
 class Message(object):
+    __slots__ = ('bot', 'raw', 'timestamp', 'tagstr', 'prefix', 'cmd',
+                 '_tags', '_params', '_param', '_source', '_user', '_host',
+                 '_time', '_channel', '_reply_to', '_trigger', '_permissions')
+
     def __init__(self, line, bot=None):
         self.bot = bot
         self.raw = line
-        self.reply_to = None
-        self.time = datetime.utcnow()
-        self.channel = None
-        self.trigger = None
-        self.permissions = {}
-        self.__dict__.update(parse_message(line))
-
-        if self.cmd in ('PRIVMSG', 'NOTICE'):
-            if self.param[0].startswith(('&', '#', '+', '!')):
-                self.channel = self.param[0].lower()
-                self.reply_to = self.param[0]
+        self.timestamp = time()
+        self._permissions = None
+
+        if line.startswith('@'):
+            self.tagstr, _, line = line[1:].partition(' ')
+        else:
+            self.tagstr = None
+
+        if line.startswith(':'):
+            self.prefix, _, line = line[1:].partition(' ')
+        else:
+            self.prefix = None
+
+        cmd, _, self._params = line.partition(' ')
+        self.cmd = cmd.upper()
+
+
+    @property
+    def tags(self):
+        try:
+            return self._tags
+        except AttributeError:
+            self._tags = parse_tags(self.tagstr)
+            return self._tags
+
+
+    @property
+    def param(self):
+        try:
+            return self._param
+        except AttributeError:
+            self._param = parse_params(self._params)
+            return self._param
+
+
+    @property
+    def source(self):
+        try:
+            return self._source
+        except AttributeError:
+            self._split_prefix()
+            return self._source
+
+
+    @property
+    def user(self):
+        try:
+            return self._user
+        except AttributeError:
+            self._split_prefix()
+            return self._user
+
+
+    @property
+    def host(self):
+        try:
+            return self._host
+        except AttributeError:
+            self._split_prefix()
+            return self._host
+
+
+    @property
+    def time(self):
+        try:
+            return self._time
+        except AttributeError:
+            self._time = None
+            if self.tagstr and 'time=' in self.tagstr:
+                try:
+                    self._time = datetime.strptime(self.tags.get('time', ''),
+                            '%Y-%m-%dT%H:%M:%S.%fZ')
+                except ValueError:
+                    pass
+            if not self._time:
+                self._time = datetime.utcfromtimestamp(self.timestamp)
+            return self._time
+
+
+    @property
+    def channel(self):
+        try:
+            return self._channel
+        except AttributeError:
+            self._route()
+            return self._channel
+
+
+    @property
+    def reply_to(self):
+        try:
+            return self._reply_to
+        except AttributeError:
+            self._route()
+            return self._reply_to
+
+
+    @property
+    def trigger(self):
+        try:
+            return self._trigger
+        except AttributeError:
+            self._route()
+            return self._trigger
+
+
+    @property
+    def permissions(self):
+        if self._permissions is None:
+            if self.bot:
+                self._permissions = self.bot.permissions.get(self.prefix)
+            else:
+                self._permissions = {}
+        return self._permissions
+
+
+    def _split_prefix(self):
+        self._source, self._user, self._host = parse_prefix(self.prefix)
+
+
+    def _route(self):
+        self._channel = None
+        self._reply_to = None
+        self._trigger = None
+
+        if self.cmd not in ('PRIVMSG', 'NOTICE') or not self.param:
+            return
+
+        if self.param[0].startswith(('&', '#', '+', '!')):
+            if self.bot:
+                self._channel = self.bot.lower(self.param[0])
             else:
-                self.reply_to = self.source
+                self._channel = self.param[0].lower()
+            self._reply_to = self.param[0]
+        else:
+            self._reply_to = self.source
 
         if self.cmd == 'PRIVMSG':
             self._detect_trigger()
@@ -74,19 +211,17 @@ class Message(object):
     def _detect_trigger(self):
         text = self.param[-1]
 
-        directed_triggers = config.config[self.bot.network] \
-                .get('directed_triggers', False)
-        if directed_triggers:
-            if self.channel:
+        if self.bot and self.bot.directed_triggers:
+            if self._channel:
                 if text.lower().startswith(self.bot.nick.lower()):
                     nicklen = len(self.bot.nick)
                     if len(text) > nicklen and text[nicklen] in [',', ':']:
-                        self.trigger = text[nicklen + 1:]
+                        self._trigger = text[nicklen + 1:]
             else:
-                self.trigger = text
+                self._trigger = text
         else:
             if text.startswith('!'):
-                self.trigger = text[1:]
+                self._trigger = text[1:]
 
 
     def reply(self, text, direct=False):
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import re
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+class Permissions(object):
+    cache_size = 1024
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.allow = None
+        self.deny = None
+        self.cache = OrderedDict()
+
+
+    def invalidate(self):
+        self.allow = None
+        self.deny = None
+        self.cache.clear()
+
+
+    def compile(self, rules):
+        compiled = []
+        for mask, levels in list(rules.items()):
+            if '*' in mask:
+                regex = '^' + re.escape(mask).replace('\\*', '.*') + '$'
+                match = re.compile(regex).match
+            else:
+                match = mask.__eq__
+            compiled.append((match, dict(levels)))
+        return compiled
+
+
+    def get(self, prefix):
+        prefix = prefix or ''
+        permissions = self.cache.get(prefix)
+        if permissions is not None:
+            self.cache.move_to_end(prefix)
+            return permissions
+
+        permissions = MappingProxyType(self.evaluate(prefix))
+        self.cache[prefix] = permissions
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return permissions
+
+
+    def evaluate(self, prefix):
+        if self.allow is None:
+            self.allow = self.compile(self.bot.allow_rules)
+            self.deny = self.compile(self.bot.deny_rules)
+
+        permissions = {}
+        for match, rules in self.allow:
+            if not match(prefix):
+                continue
+
+            for plugin, level in rules.items():
+                current_level = permissions.get(plugin, level)
+                permissions[plugin] = max(level, current_level)
+
+        for match, rules in self.deny:
+            if not match(prefix):
+                continue
+
+            for plugin, level in rules.items():
+                if plugin == 'ANY':
+                    for plugin, current_level in list(permissions.items()):
+                        permissions[plugin] = min(level, current_level)
+                    continue
+                current_level = permissions.get(plugin, level)
+                permissions[plugin] = min(level, current_level)
+
+        return permissions
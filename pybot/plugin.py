@@ -4,23 +4,39 @@
 import importlib
 import sys
 import traceback
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from inspect import signature
 
-import reloader
-reloader.enable()
-
-from . import config
+from . import config, manifest
 from .decorators import hook, level, priority
+from .hook import CommandHook, TriggerHook, UrlHook, hook_registry
 
 
 __all__ = ['BasePlugin', 'hook', 'priority', 'level']
 
 
 class BasePlugin(object):
+    default_workers = 2
+    max_workers = None
+    default_queue_depth = 16
+    lazy = True
+    scope = 'network'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        hook_registry(cls)
+
+
     def __init__(self, bot, name, module):
         self.bot = bot
+        self.bots = [bot]
+        self.core = bot.core
         self.name = name
         self.module = module
+        self.executor = None
+        self.pending = 0
 
 
     def on_load(self, reload):
@@ -35,10 +51,122 @@ class BasePlugin(object):
         pass
 
 
+    def get_state(self):
+        return None
+
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+
+    def on_config_changed(self, old, new):
+        pass
+
+
+    def submit(self, fn, *args, callback=None):
+        if not self.executor:
+            workers = self.config.get('workers', self.default_workers)
+            if self.max_workers:
+                workers = min(workers, self.max_workers)
+            prefix = self.bot.network if self.bot else 'global'
+            self.executor = ThreadPoolExecutor(workers,
+                    thread_name_prefix='%s-%s' % (prefix, self.name))
+
+        depth = self.config.get('queue_depth', self.default_queue_depth)
+        if self.pending >= depth:
+            return None
+
+        self.pending += 1
+        executor = self.executor
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda future:
+                self.core.call_soon_threadsafe(self._complete, executor,
+                        future, callback))
+        return future
+
+
+    def defer(self, msg, fn, *args, callback=None):
+        future = self.submit(fn, *args, callback=callback)
+        if not future:
+            print("plugin '%s': queue full, dropping %s" % (self.name,
+                    fn.__name__))
+            msg.reply('Busy, try again in a moment.')
+        return future
+
+
+    def _complete(self, executor, future, callback):
+        if executor is not self.executor:
+            return
+
+        self.pending -= 1
+        if future.cancelled():
+            return
+
+        try:
+            result = future.result()
+            if callback:
+                with ExitStack() as stack:
+                    for bot in self.bots:
+                        stack.enter_context(bot.batch())
+                    callback(result)
+        except:
+            print("plugin '%s': worker error" % self.name)
+            traceback.print_exc()
+
+
+    def shutdown_executor(self, wait=False):
+        if self.executor:
+            executor, self.executor = self.executor, None
+            self.pending = 0
+            executor.shutdown(wait, cancel_futures=True)
+
+
+class PluginStub(object):
+    def __init__(self, manager, name, hooks):
+        self.manager = manager
+        self.name = name
+        self.hooks = [self.stub(*hook) for hook in hooks]
+
+
+    def stub(self, _type, name, level, priority):
+        if _type == 'trigger':
+            hook = TriggerHook(name)
+            def fn(self, msg, args, argstr):
+                return self.activate(hook, msg, args, argstr)
+        elif _type == 'command':
+            hook = CommandHook(name)
+            def fn(self, msg):
+                return self.activate(hook, msg)
+        elif _type == 'url':
+            hook = UrlHook(name)
+            def fn(self, msg, domain, url):
+                return self.activate(hook, msg, domain, url)
+        else:
+            raise Exception('%s hooks can not be deferred' % _type)
+
+        fn._level = level
+        fn._priority = priority
+        hook.bind(types.MethodType(fn, self), self)
+        return hook
+
+
+    def activate(self, model, *args):
+        plugin = self.manager.activate(self.name)
+        if not plugin:
+            return
+
+        hooks = self.manager.bot.hooks
+        hook_seq = [h for h in hooks.find(model) if h.owner is plugin]
+        if type(model) == TriggerHook:
+            hook_seq = [h for h in hook_seq if hooks.allowed(h, args[0])]
+        return hooks.call(hook_seq, *args)
+
+
 class PluginManager(object):
     def __init__(self, bot):
         self.bot = bot
         self.plugins = {}
+        self.deferred = {}
 
 
     def _error(self, name, message, show_traceback=False):
@@ -70,13 +198,25 @@ class PluginManager(object):
         if error: return None, error
 
         try:
-            reloader.reload(module)
+            if self.bot.core.production:
+                self._reload_package(module)
+            else:
+                import reloader
+                reloader.reload(module)
         except:
             return None, self._error(name, 'module reload failure', True)
 
         return module, None
 
 
+    def _reload_package(self, module):
+        prefix = module.__name__ + '.'
+        for name in sorted((name for name in sys.modules
+                if name.startswith(prefix)), reverse=True):
+            importlib.reload(sys.modules[name])
+        importlib.reload(module)
+
+
     def _unload_module(self, name):
         if name not in sys.modules:
             return
@@ -87,7 +227,7 @@ class PluginManager(object):
         return None
 
 
-    def _load_plugin(self, name):
+    def _load_plugin(self, name, replaces=None):
         module, error = self._load_module(name)
         if error: return None, error
 
@@ -103,8 +243,16 @@ class PluginManager(object):
             self._unload_module(name)
             return None, self._error(name, 'init error', True)
 
+        plugin.scope = config.plugin_options(self.bot, name).get('scope',
+                plugin.scope)
+        if plugin.scope == 'global':
+            plugin.bot = None
+
         try:
-            self.bot.hooks.install_owner(plugin)
+            if replaces:
+                self.bot.hooks.rebind_owner(replaces, plugin)
+            else:
+                self.bot.hooks.install_owner(plugin)
         except:
             try:
                 params = signature(plugin.on_unload).parameters
@@ -128,15 +276,101 @@ class PluginManager(object):
         except:
             return self._error(name, 'unhook error', True)
 
+        plugin.shutdown_executor()
         return None
 
 
+    def _rebind_shared(self, old_plugin, new_plugin):
+        new_plugin.bots = old_plugin.bots
+        for bot in new_plugin.bots:
+            if bot is self.bot:
+                continue
+            bot.hooks.rebind_owner(old_plugin, new_plugin)
+            bot.plugins.plugins[new_plugin.name] = new_plugin
+        self.bot.core.shared_plugins[new_plugin.name] = new_plugin
+
+
+    def _check_shared_options(self, plugin, options):
+        if options != plugin.config:
+            print("plugin '%s': options for %s ignored, shared instance uses "
+                  "those of %s" % (plugin.name, self.bot.network,
+                                   plugin.bots[0].network))
+
+
+    def _drop_shared(self, plugin):
+        if self.bot.core.shared_plugins.get(plugin.name) is not plugin:
+            return
+        del self.bot.core.shared_plugins[plugin.name]
+        for bot in plugin.bots:
+            if bot is self.bot:
+                continue
+            bot.hooks.uninstall_owner(plugin)
+            del bot.plugins.plugins[plugin.name]
+            bot.hooks.call_event('plugin unloaded', plugin.name)
+
+
+    def autoload(self, name):
+        if name != 'base' and name not in self.bot.core.shared_plugins and \
+                self.bot.config.get('lazy_plugins', False):
+            options = config.plugin_options(self.bot, name)
+            if options.get('lazy', True):
+                hooks = manifest.hooks_for(self.bot, name, options)
+                if hooks is not None:
+                    return self.defer(name, hooks)
+
+        return self.load(name)
+
+
+    def defer(self, name, hooks):
+        if name in self.plugins or name in self.deferred:
+            return self._error(name, 'already loaded')
+
+        try:
+            stub = PluginStub(self, name, hooks)
+        except:
+            return self._error(name, 'manifest error', True)
+
+        for hook in stub.hooks:
+            self.bot.hooks.install(hook)
+        self.deferred[name] = stub
+
+        self.bot.hooks.call_event('plugin deferred', name)
+
+
+    def activate(self, name):
+        if name not in self.plugins:
+            self.load(name)
+        return self.plugins.get(name)
+
+
+    def _undefer(self, name):
+        stub = self.deferred.pop(name, None)
+        if stub:
+            self.bot.hooks.uninstall_owner(stub)
+
+
     def load(self, name):
         if name in self.plugins:
             return self._error(name, 'already loaded')
 
+        self._undefer(name)
         self.bot.hooks.call_event('plugin loading', name)
 
+        shared = self.bot.core.shared_plugins.get(name)
+        if shared and config.plugin_options(self.bot, name).get('scope',
+                shared.scope) == 'global':
+            try:
+                self.bot.hooks.install_owner(shared)
+            except:
+                self.bot.hooks.uninstall_owner(shared)
+                return self._error(name, 'hook error', True)
+            shared.bots.append(self.bot)
+            self.plugins[name] = shared
+            self._check_shared_options(shared,
+                    config.plugin_options(self.bot, name))
+            self.bot.hooks.call_event('plugin loaded', name)
+            return
+
         plugin, error = self._load_plugin(name)
         if error: return error
         plugin.config = config.plugin_options(self.bot, name)
@@ -160,11 +394,16 @@ class PluginManager(object):
             return self._error(name, 'on_load error', True)
 
         self.plugins[name] = plugin
+        if plugin.scope == 'global':
+            self.bot.core.shared_plugins[name] = plugin
 
         self.bot.hooks.call_event('plugin loaded', name)
 
 
     def reload(self, name, force=False):
+        if name in self.deferred:
+            return self.load(name)
+
         if name not in self.plugins:
             return self._error(name, 'not loaded')
 
@@ -182,13 +421,19 @@ class PluginManager(object):
         _, error = self._reload_module(name)
         if error: return error
 
-        new_plugin, error = self._load_plugin(name)
+        new_plugin, error = self._load_plugin(name, old_plugin)
         if error: return error
         new_plugin.config = config.plugin_options(self.bot, name)
 
         error = self._unload_plugin(old_plugin)
         if error: return error
 
+        state = None
+        try:
+            state = old_plugin.get_state()
+        except:
+            self._error(name, 'get_state error', True)
+
         try:
             params = signature(old_plugin.on_unload).parameters
             if len(params) == 0:
@@ -214,20 +459,42 @@ class PluginManager(object):
             except:
                 pass
             self._unload_plugin(new_plugin)
+            self._drop_shared(old_plugin)
             return self._error(name, 'on_load error', True)
 
+        if state is not None:
+            try:
+                new_plugin.set_state(state)
+            except:
+                self._error(name, 'set_state error, starting cold', True)
+
         self.plugins[name] = new_plugin
+        if old_plugin.scope == 'global':
+            self._rebind_shared(old_plugin, new_plugin)
 
-        self.bot.hooks.call_event('plugin reloaded', name)
+        for bot in new_plugin.bots:
+            bot.hooks.call_event('plugin reloaded', name)
 
 
     def unload(self, name, force=False):
+        if name in self.deferred:
+            self._undefer(name)
+            self.bot.hooks.call_event('plugin unloaded', name)
+            return
+
         if name not in self.plugins:
             return self._error(name, 'not loaded')
 
         self.bot.hooks.call_event('plugin unloading', name)
 
         plugin = self.plugins[name]
+        if len(plugin.bots) > 1:
+            self.bot.hooks.uninstall_owner(plugin)
+            plugin.bots.remove(self.bot)
+            del self.plugins[name]
+            self.bot.hooks.call_event('plugin unloaded', name)
+            return
+
         abort = False
         try:
             params = signature(plugin.on_unload).parameters
@@ -243,6 +510,8 @@ class PluginManager(object):
         self._unload_plugin(plugin)
 
         del self.plugins[name]
+        if self.bot.core.shared_plugins.get(name) is plugin:
+            del self.bot.core.shared_plugins[name]
 
         error = self._unload_module(name)
         if error: return error
@@ -250,5 +519,33 @@ class PluginManager(object):
         self.bot.hooks.call_event('plugin unloaded', name)
 
 
+    def reconfigure(self, old, new):
+        old_autoload = config.autoload_list(self.bot, old)
+        new_autoload = config.autoload_list(self.bot, new)
+
+        for name in old_autoload:
+            if name not in new_autoload and name in self.list():
+                self.unload(name)
+
+        for name in new_autoload:
+            if name not in old_autoload and name not in self.list():
+                self.autoload(name)
+
+        for name, plugin in list(self.plugins.items()):
+            options = config.plugin_options(self.bot, name)
+            if plugin.bots[0] is not self.bot:
+                self._check_shared_options(plugin, options)
+                continue
+
+            if options == plugin.config:
+                continue
+
+            old_options, plugin.config = plugin.config, options
+            try:
+                plugin.on_config_changed(old_options, options)
+            except:
+                self._error(name, 'on_config_changed error', True)
+
+
     def list(self):
-        return list(self.plugins.keys())
+        return list(self.plugins.keys()) + list(self.deferred.keys())
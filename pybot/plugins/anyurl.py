@@ -6,7 +6,6 @@ from html.parser import HTMLParser
 import re
 import requests
 
-from pybot import config
 from pybot.plugin import *
 
 
@@ -44,6 +43,30 @@ class TitleParser(HTMLParser):
             self.match = False
 
 
+def fetch_title(url, headers):
+    try:
+        r = requests.get(url, stream=True, headers=headers, timeout=10)
+    except requests.exceptions.ReadTimeout:
+        return 'URL Timeout'
+
+    content_type, params = cgi.parse_header(r.headers.get('Content-Type', ''))
+    if not content_type in content_types:
+        return None
+
+    r.encoding = 'utf-8'
+    if 'charset' in params:
+        r.encoding = params['charset'].strip("'\"")
+
+    parser = TitleParser()
+
+    for line in r.iter_lines(chunk_size=1024, decode_unicode=True):
+        parser.feed(line)
+        if parser.title:
+            break
+
+    return '\x031,0URL\x03 %s' % parser.title
+
+
 class Plugin(BasePlugin):
     default_priority = 1
 
@@ -58,32 +81,18 @@ class Plugin(BasePlugin):
         default_ua = 'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; " \
                 "compatible; pybot/1.0.3; +https://github.com/jkent/pybot) " \
                 "Safari/537.36'
-        user_agent = config.config[self.bot.network].get('plugins', {}) \
-                .get('anyurl', {}).get('user-agent', default_ua)
+        user_agent = self.config.get('user-agent', default_ua)
 
         headers = {
             'User-Agent': user_agent
         }
 
-        try:
-            r = requests.get(url, stream=True, headers=headers, timeout=10)
-        except requests.exceptions.ReadTimeout:
-            msg.reply('URL Timeout')
-            return
-
-        content_type, params = cgi.parse_header(r.headers.get('Content-Type', ''))
-        if not content_type in content_types:
-            return
-
-        r.encoding = 'utf-8'
-        if 'charset' in params:
-            r.encoding = params['charset'].strip("'\"")
-
-        parser = TitleParser()
+        if not self.submit(fetch_title, url, headers,
+                callback=lambda text: self.reply(msg, text)):
+            print("plugin '%s': queue full, dropping title of %s" % (
+                    self.name, url))
 
-        for line in r.iter_lines(chunk_size=1024, decode_unicode=True):
-            parser.feed(line)
-            if parser.title:
-                break
 
-        msg.reply('\x031,0URL\x03 %s' % parser.title)
+    def reply(self, msg, text):
+        if text:
+            msg.reply(text)
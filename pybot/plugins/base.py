@@ -5,6 +5,7 @@ from pybot.plugin import *
 
 BOT_PING_TIME = 120
 BOT_PING_TIMEOUT = 60
+DEFAULT_CAPS = ['server-time', 'message-tags', 'batch']
 
 
 class Plugin(BasePlugin):
@@ -13,10 +14,13 @@ class Plugin(BasePlugin):
         self.connecting = False
         self.send_ping_hook = None
         self.ping_timeout_hook = None
+        self.available_caps = set()
+        self.negotiating = False
+        self.registered = False
 
 
     def on_load(self):
-        self.channels = self.config.get('channels', [])
+        self.channels = list(self.config.get('channels', []))
 
 
     def on_unload(self, reload):
@@ -24,12 +28,50 @@ class Plugin(BasePlugin):
             return True
 
 
+    def on_config_changed(self, old, new):
+        old_channels = self.channel_keys(old.get('channels', ()))
+        new_channels = self.channel_keys(new.get('channels', ()))
+
+        for name, key in new_channels.items():
+            if name in old_channels:
+                continue
+            if self.registered:
+                self.bot.join(name, key)
+            else:
+                self.channels.append((name, key))
+
+        for name in old_channels:
+            if name in new_channels:
+                continue
+            pending = [channel for channel in self.channels
+                       if self.split_channel(channel)[0] == name]
+            for channel in pending:
+                self.channels.remove(channel)
+            if not pending and self.registered:
+                self.bot.part(name)
+
+
+    def split_channel(self, channel):
+        if isinstance(channel, str):
+            return channel, None
+        return channel[0], channel[1] if len(channel) > 1 else None
+
+
+    def channel_keys(self, channels):
+        return dict(self.split_channel(channel) for channel in channels)
+
+
     @hook
     def connect_event(self):
         password = self.config.get('connect_password')
         if password:
             self.bot.send('PASS %s %s %s' % (password, '0210', 'IRC|'))
 
+        self.available_caps.clear()
+        self.negotiating = True
+        self.registered = False
+        self.bot.send('CAP LS 302')
+
         nickname = self.config.get('nickname', 'pybot')
         self.bot.send('NICK %s' % nickname)
 
@@ -41,16 +83,17 @@ class Plugin(BasePlugin):
 
     @hook
     def disconnect_event(self):
+        self.registered = False
         if self.bot.core.in_shutdown:
             return
         if not self.channels:
-            for channel, props in self.bot.channels.items():
-                if not props['joined']:
+            for channel in self.bot.channels.values():
+                if not channel.joined:
                     continue
-                if 'key' in props:
-                    self.channels.append((channel, props['key']))
+                if channel.key:
+                    self.channels.append((channel.name, channel.key))
                 else:
-                    self.channels.append(channel)
+                    self.channels.append(channel.name)
         self.schedule_reconnect()
 
 
@@ -74,6 +117,48 @@ class Plugin(BasePlugin):
             self.schedule_reconnect()
 
 
+    def wanted_caps(self):
+        wanted = set(self.config.get('caps', DEFAULT_CAPS))
+        return (wanted & self.available_caps) - self.bot.caps
+
+
+    @hook
+    def cap_command(self, msg):
+        subcommand = msg.param[1].upper()
+        caps = msg.param[-1].split()
+
+        if subcommand in ('LS', 'NEW'):
+            self.available_caps.update(cap.split('=', 1)[0] for cap in caps)
+            if subcommand == 'LS' and msg.param[2] == '*':
+                return
+
+            wanted = self.wanted_caps()
+            if wanted:
+                self.bot.send('CAP REQ :%s' % ' '.join(sorted(wanted)))
+            elif self.negotiating:
+                self.end_negotiation()
+        elif subcommand == 'ACK':
+            for cap in caps:
+                if cap.startswith('-'):
+                    self.bot.caps.discard(cap[1:])
+                else:
+                    self.bot.caps.add(cap)
+            if self.negotiating:
+                self.end_negotiation()
+        elif subcommand == 'NAK':
+            if self.negotiating:
+                self.end_negotiation()
+        elif subcommand == 'DEL':
+            for cap in caps:
+                self.available_caps.discard(cap)
+                self.bot.caps.discard(cap)
+
+
+    def end_negotiation(self):
+        self.negotiating = False
+        self.bot.send('CAP END')
+
+
     @hook
     def error_command(self, msg):
         if 'ban' in msg.param[-1]:
@@ -86,22 +171,20 @@ class Plugin(BasePlugin):
         if password:
             self.bot.privmsg('NickServ', 'identify %s' % (password))
         self.connecting = False
+        self.registered = True
         for channel in self.channels:
-            if isinstance(channel, tuple):
-                self.bot.join(channel[0], channel[1])
-            else:
-                self.bot.join(channel)
+            self.bot.join(*self.split_channel(channel))
         del self.channels[:]
 
 
     @hook
     def recv_event(self):
         if self.send_ping_hook:
-            self.bot.hooks.uninstall(self.send_ping_hook)
+            self.send_ping_hook.cancel()
             self.send_ping_hook = None
 
         if self.ping_timeout_hook:
-            self.bot.hooks.uninstall(self.ping_timeout_hook)
+            self.ping_timeout_hook.cancel()
             self.ping_timeout_hook = None
 
         self.send_ping_hook = self.bot.set_timeout(self.send_ping,
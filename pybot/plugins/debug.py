@@ -33,6 +33,11 @@ class Plugin(BasePlugin):
         print('loaded plugin %s' % name)
 
 
+    @hook
+    def plugin_deferred_event(self, name):
+        print('deferred plugin %s' % name)
+
+
     @hook
     def plugin_reloading_event(self, name):
         print('reloading plugin %s' % name)
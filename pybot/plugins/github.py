@@ -14,7 +14,7 @@ user_api_url = 'https://api.github.com/users/{user}'
 
 
 def get_json_data(url, **kwargs):
-    r = requests.get(url.format(**kwargs))
+    r = requests.get(url.format(**kwargs), timeout=10)
 
     if r.status_code not in [200, 301, 304]:
         return None
@@ -22,6 +22,26 @@ def get_json_data(url, **kwargs):
     return r.json()
 
 
+def fetch_info(user, repo):
+    lines = []
+    if repo:
+        data = get_json_data(repo_api_url, user=user, repo=repo)
+        if not data:
+            return lines
+        lines.append('\x031,0GitHub\x03 %s' % (data['description'],))
+
+        data = get_json_data(commits_api_url, user=user, repo=repo)
+        if not data:
+            return lines
+        lines.append('Last commit: %s' % (data[0]['commit']['message'],))
+    else:
+        data = get_json_data(user_api_url, user=user)
+        if not data:
+            return lines
+        lines.append('\x031,0GitHub\x03 %s: %d repos, %d gists' % (data['name'], data['public_repos'], data['public_gists']))
+    return lines
+
+
 class Plugin(BasePlugin):
     @hook('www.github.com')
     @hook('github.com')
@@ -36,18 +56,10 @@ class Plugin(BasePlugin):
         user = m.group('user')
         repo = m.group('repo')
 
-        if repo:
-            data = get_json_data(repo_api_url, user=user, repo=repo)
-            if not data:
-                return
-            msg.reply('\x031,0GitHub\x03 %s' % (data['description'],))
-
-            data = get_json_data(commits_api_url, user=user, repo=repo)
-            if not data:
-                return
-            msg.reply('Last commit: %s' % (data[0]['commit']['message'],))
-        else:
-            data = get_json_data(user_api_url, user=user)
-            if not data:
-                return
-            msg.reply('\x031,0GitHub\x03 %s: %d repos, %d gists' % (data['name'], data['public_repos'], data['public_gists']))
+        self.defer(msg, fetch_info, user, repo,
+                callback=lambda lines: self.reply(msg, lines))
+
+
+    def reply(self, msg, lines):
+        for line in lines:
+            msg.reply(line)
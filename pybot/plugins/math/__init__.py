@@ -17,8 +17,10 @@ VAR_TYPE_STR     = 3
 
 
 class Plugin(BasePlugin):
+    scope = 'global'
+
     def on_load(self, reload):
-        self.db = sqlite3.connect(os.path.join(self.bot.core.data_path, 'math.db'))
+        self.db = sqlite3.connect(os.path.join(self.core.data_path, 'math.db'))
         c = self.db.cursor()
         c.execute('''
             CREATE TABLE IF NOT EXISTS Workbook (
@@ -50,15 +52,47 @@ class Plugin(BasePlugin):
         self.db.close()
 
 
-    def load_workbook(self, target, name):
+    def get_state(self):
+        return {'workbooks': self.workbooks,
+                'target_to_workbook': self.target_to_workbook}
+
+
+    def set_state(self, state):
+        BasePlugin.set_state(self, state)
+        for workbook in self.workbooks.values():
+            workbook['exc_handler'] = self.exc_handler
+            workbook['stale'] = True
+
+
+    def refresh_workbook(self, workbook):
+        if not workbook.pop('stale', False):
+            return workbook
+
+        funcs = workbook['funcs']
+        workbook['funcs'] = expression.BUILTIN_FUNCS.copy()
+        for name, func in funcs.items():
+            if not func.get('expr'):
+                continue
+            try:
+                expression.define_func(workbook, name, ','.join(func['args']),
+                        func['expr'], func.get('desc'))
+            except (expression.DeclarationError,
+                    expression.ExpressionError) as exc:
+                print("math: dropping func '%s' from workbook '%s': %s" % (
+                        name, workbook['name'], exc))
+        return workbook
+
+
+    def load_workbook(self, network, target, name):
         if ':' not in name:
             name = target + ':' + name
 
         if name in self.workbooks:
-            self.target_to_workbook[target] = self.workbooks[name]
-            return self.target_to_workbook[target]
+            self.target_to_workbook[network, target] = self.workbooks[name]
+            return self.refresh_workbook(self.workbooks[name])
 
-        self.target_to_workbook[target] = self.workbooks[name] = workbook = {}
+        self.target_to_workbook[network, target] = self.workbooks[name] = \
+                workbook = {}
         workbook['name'] = name
         workbook['exc_handler'] = self.exc_handler
         workbook['globals'] = expression.BUILTIN_VARS.copy()
@@ -97,11 +131,12 @@ class Plugin(BasePlugin):
         return workbook
 
 
-    def get_workbook(self, target):
-        if target in self.target_to_workbook:
-            return self.target_to_workbook[target]
+    def get_workbook(self, network, target):
+        if (network, target) in self.target_to_workbook:
+            return self.refresh_workbook(
+                    self.target_to_workbook[network, target])
 
-        return self.load_workbook(target, 'Default')
+        return self.load_workbook(network, target, 'Default')
 
 
     def exc_handler(self, name, args, exc, workbook, expr):
@@ -173,7 +208,7 @@ class Plugin(BasePlugin):
     @hook
     def math_trigger(self, msg, args, argstr):
         self.lastmsg = msg
-        workbook = self.get_workbook(msg.reply_to)
+        workbook = self.get_workbook(msg.bot.network, msg.reply_to)
 
         line = str(argstr).strip()
 
@@ -212,18 +247,18 @@ class Plugin(BasePlugin):
     @hook
     def math_workbook_trigger(self, msg, args, argstr):
         if len(args) <= 1:
-            workbook = self.get_workbook(msg.reply_to)
+            workbook = self.get_workbook(msg.bot.network, msg.reply_to)
             msg.reply("%s workbook, %d vars, %d funcs" % (workbook['name'], \
                 len(workbook['globals']), len(workbook['funcs'])))
             return True
 
-        self.load_workbook(msg.reply_to, args[1])
+        self.load_workbook(msg.bot.network, msg.reply_to, args[1])
         return True
 
 
     @hook
     def math_varlist_trigger(self, msg, args, argstr):
-        workbook = self.get_workbook(msg.reply_to)
+        workbook = self.get_workbook(msg.bot.network, msg.reply_to)
         names = list(workbook.get('globals', {}).keys())
         names.sort()
         msg.reply(', '.join(names))
@@ -232,7 +267,7 @@ class Plugin(BasePlugin):
 
     @hook
     def math_funclist_trigger(self, msg, args, argstr):
-        workbook = self.get_workbook(msg.reply_to)
+        workbook = self.get_workbook(msg.bot.network, msg.reply_to)
         names = list(workbook.get('funcs', {}).keys())
         names.sort()
         msg.reply(', '.join(names))
@@ -241,7 +276,7 @@ class Plugin(BasePlugin):
 
     @hook
     def math_describe_trigger(self, msg, args, argstr):
-        workbook = self.get_workbook(msg.reply_to)
+        workbook = self.get_workbook(msg.bot.network, msg.reply_to)
         if len(args) < 2:
             msg.reply('a func name is required')
             return True
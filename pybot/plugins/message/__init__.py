@@ -14,14 +14,29 @@ RETRY_INTERVAL = 3600
 
 
 class Plugin(BasePlugin):
+    max_workers = 1
+    scope = 'global'
+
     def on_load(self):
-        self.db = models.init(self.bot)
+        self.db = models.init(self.core)
+        self.notifying = set()
 
 
     def on_unload(self):
+        self.shutdown_executor(True)
         self.db.close()
 
 
+    def defer(self, msg, fn, *args):
+        return BasePlugin.defer(self, msg, fn, *args, callback=lambda replies:
+                self.reply(msg, replies))
+
+
+    def reply(self, msg, replies):
+        for text, direct in replies:
+            msg.reply(text, direct)
+
+
     @hook
     def message_send_trigger(self, msg, args, argstr):
         try:
@@ -30,12 +45,6 @@ class Plugin(BasePlugin):
             msg.reply('Expected: <addressee> <text>')
             return True
 
-        optout = self.db.query(Preference).filter_by(nick=addressee,
-                key='optout').first()
-        if optout and optout.value.lower() == 'true':
-            msg.reply('Recipient has opted out of messages.')
-            return True
-
         channel = msg.channel
         delta = None
 
@@ -60,14 +69,24 @@ class Plugin(BasePlugin):
 
             text = re.sub(cmd, '', text)
 
+        self.defer(msg, self.send_message, msg.source, addressee, text,
+                channel, delta)
+        return True
+
+
+    def send_message(self, source, addressee, text, channel, delta):
+        optout = self.db.query(Preference).filter_by(nick=addressee,
+                key='optout').first()
+        if optout and optout.value.lower() == 'true':
+            return [('Recipient has opted out of messages.', False)]
+
         if not self.db.query(Block).filter_by(nick=addressee,
-                block=msg.source).first():
-            message = Message(msg.source, addressee, text, channel, delta)
+                block=source).first():
+            message = Message(source, addressee, text, channel, delta)
             self.db.add(message)
             self.db.commit()
 
-        msg.reply('Message queued!')
-        return True
+        return [('Message queued!', False)]
 
 
     @hook
@@ -77,21 +96,24 @@ class Plugin(BasePlugin):
             msg.reply('No arguments allowed.')
             return True
 
+        self.defer(msg, self.ack_messages, msg.source)
+        return True
+
+
+    def ack_messages(self, source):
         count = 0
         query = self.db.query(Message) \
-                .filter(func.lower(Message.addressee)==func.lower(msg.source))
+                .filter(func.lower(Message.addressee)==func.lower(source))
         for message in query:
             count += 1
             self.db.delete(message)
 
         if count:
             self.db.commit()
-            msg.reply('Ack\'d %d message%s.' %
-                    (count, 's' if count > 1 else ''))
+            return [('Ack\'d %d message%s.' %
+                    (count, 's' if count > 1 else ''), False)]
         else:
-            msg.reply('No messages to ack.')
-
-        return True
+            return [('No messages to ack.', False)]
 
 
     @hook
@@ -100,20 +122,27 @@ class Plugin(BasePlugin):
             msg.reply('No arguments allowed.')
             return True
 
-        query = self.db.query(Message).filter_by(nick=msg.source)
+        self.defer(msg, self.list_messages, msg.source)
+        return True
+
+
+    def list_messages(self, source):
+        replies = []
+
+        query = self.db.query(Message).filter_by(nick=source)
         for message in query:
             text = '(%d) %s: %s' % (message.id, message.addressee,
                     message.text)
-            msg.reply(text, direct=True)
+            replies.append((text, True))
 
         query = self.db.query(Message) \
                 .filter_by(presented=True) \
-                .filter(func.lower(Message.addressee)==func.lower(msg.source))
+                .filter(func.lower(Message.addressee)==func.lower(source))
         for message in query:
             text = '(%d) <%s> %s' % (message.id, message.nick, message.text)
-            msg.reply(text, direct=True)
+            replies.append((text, True))
 
-        return True
+        return replies
 
 
     @hook
@@ -128,17 +157,20 @@ class Plugin(BasePlugin):
             msg.reply('Expected: <id>')
             return True
 
+        self.defer(msg, self.delete_message, msg.source, id)
+        return True
+
+
+    def delete_message(self, source, id):
         message = self.db.query(Message).filter_by(id=id) \
-                .filter(or_(func.lower(Message.nick) == func.lower(msg.source),
-                and_(func.lower(Message.addressee) == func.lower(msg.source),
+                .filter(or_(func.lower(Message.nick) == func.lower(source),
+                and_(func.lower(Message.addressee) == func.lower(source),
                 Message.presented == True))).first()
         if message:
             self.db.delete(message)
-            msg.reply('Message deleted.')
+            return [('Message deleted.', False)]
         else:
-            msg.reply('Unknown message.')
-
-        return True
+            return [('Unknown message.', False)]
 
 
     @hook
@@ -147,20 +179,25 @@ class Plugin(BasePlugin):
             msg.reply('Expected: <in | out>')
             return True
 
+        self.defer(msg, self.set_optout, msg.source, args[1].lower() == 'out')
+        return True
+
+
+    def set_optout(self, source, out):
         optout = self.db.query(Preference) \
                 .filter_by(key='optout') \
-                .filter(func.lower(Preference.nick)==func.lower(msg.source)) \
+                .filter(func.lower(Preference.nick)==func.lower(source)) \
                 .first()
         if not optout:
-            optout = Preference(msg.source, 'optout', 'False')
+            optout = Preference(source, 'optout', 'False')
 
         optout.value = 'False'
-        if args[1].lower() == 'out':
+        if out:
             optout.value = 'True'
 
         self.db.add(optout)
         self.db.commit()
-        return True
+        return []
 
 
     @hook
@@ -169,14 +206,17 @@ class Plugin(BasePlugin):
             msg.reply('Expected: <nick>')
             return True
 
+        self.defer(msg, self.block_nick, msg.source, args[1])
+        return True
+
+
+    def block_nick(self, source, nick):
         try:
-            block = Block(msg.source, args[1])
+            block = Block(source, nick)
             self.db.add(block)
-            msg.reply('Blocked %s.' % (args[1],))
+            return [('Blocked %s.' % (nick,), False)]
         except:
-            msg.reply('Already blocked.')
-
-        return True
+            return [('Already blocked.', False)]
 
 
     @hook
@@ -185,39 +225,59 @@ class Plugin(BasePlugin):
             msg.reply('Expected: <nick>')
             return True
 
+        self.defer(msg, self.unblock_nick, msg.source, args[1])
+        return True
+
+
+    def unblock_nick(self, source, nick):
         block = self.db.query(Block) \
-                .filter_by(block=args[1]) \
-                .filter(func.lower(Block.nick)==func.lower(msg.source)) \
+                .filter_by(block=nick) \
+                .filter(func.lower(Block.nick)==func.lower(source)) \
                 .first()
         if block:
             self.db.delete(block)
-            msg.reply('Unblocked %s.' % (args[1],))
+            return [('Unblocked %s.' % (nick,), False)]
         else:
-            msg.reply('Not blocked.')
-
-        return True
+            return [('Not blocked.', False)]
 
 
     @hook
     def privmsg_command(self, msg):
+        key = (msg.bot.network, msg.source, msg.channel)
+        depth = self.config.get('queue_depth', self.default_queue_depth)
+        lane = max(depth // 2, 1)
+        if key in self.notifying or len(self.notifying) >= lane:
+            return
+
+        future = self.submit(self.notify, msg.source, msg.channel,
+                callback=lambda replies: self.reply(msg, replies))
+        if future:
+            self.notifying.add(key)
+            future.add_done_callback(lambda future:
+                    self.core.call_soon_threadsafe(self.notifying.discard,
+                            key))
+
+
+    def notify(self, source, channel):
         now = datetime.utcnow()
+        replies = []
 
         query = self.db.query(Message) \
-                .filter(func.lower(Message.addressee)==func.lower(msg.source)) \
+                .filter(func.lower(Message.addressee)==func.lower(source)) \
                 .filter(Message.next_notify < now)
 
         presented = False
 
         for message in query:
-            if message.channel and message.channel != msg.channel:
+            if message.channel and message.channel != channel:
                 continue
 
             text = '<%s> %s' % (message.nick, message.text)
 
             if message.channel:
-                msg.reply('%s: %s' % (message.addressee, text))
+                replies.append(('%s: %s' % (message.addressee, text), False))
             else:
-                msg.reply(text, True)
+                replies.append((text, True))
 
             message.presented = True
             message.next_notify = now + timedelta(seconds=RETRY_INTERVAL)
@@ -225,3 +285,5 @@ class Plugin(BasePlugin):
 
         if presented:
             self.db.commit()
+
+        return replies
@@ -71,8 +71,9 @@ class Block(Base):
         return '<Block(nick=\'%s\', block=\'%s\'>' % (self.nick, self.block)
 
 
-def init(bot):
-    engine = create_engine('sqlite:///' + os.path.join(bot.core.data_path, 'message.db'))
+def init(core):
+    engine = create_engine('sqlite:///' + os.path.join(core.data_path,
+            'message.db'), connect_args={'check_same_thread': False})
     Base.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
     return Session()
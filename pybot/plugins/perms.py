@@ -10,6 +10,7 @@ from pybot.plugin import *
 
 class Plugin(BasePlugin):
     default_level = 1000
+    lazy = False
 
 
     def on_load(self):
@@ -29,6 +30,13 @@ class Plugin(BasePlugin):
         self.db.close()
 
 
+    def on_config_changed(self, old, new):
+        superuser = new.get('superuser')
+        if superuser and superuser != old.get('superuser'):
+            self.bot.allow_rules[superuser] = {'ANY': 1000}
+            self.bot.permissions.invalidate()
+
+
     def load_rules(self):
         self.bot.allow_rules = {}
         self.bot.deny_rules = {}
@@ -50,6 +58,8 @@ class Plugin(BasePlugin):
         if superuser:
             self.bot.allow_rules[superuser] = {'ANY': 1000}
 
+        self.bot.permissions.invalidate()
+
 
     def save_rules(self):
         for mask, rules in list(self.bot.allow_rules.items()):
@@ -95,6 +105,7 @@ class Plugin(BasePlugin):
             mask = mask[1:]
             if mask in self.bot.allow_rules:
                 del self.bot.allow_rules[mask]
+                self.bot.permissions.invalidate()
                 self.cur.execute('DELETE FROM allow WHERE mask=?', (mask,))
                 self.db.commit()
             return
@@ -108,16 +119,18 @@ class Plugin(BasePlugin):
                     del rules[plugin]
                 except:
                     msg.reply('no rule exists for plugin "%s"' % plugin)
-                    return
+                    break
             else:
                 try:
                     plugin, level = arg.split('=', 1)
                     level = int(level)
                 except:
                     msg.reply('invalid syntax, "plugin=level" format required')
-                    return
+                    break
                 rules[plugin] = level
 
+        self.bot.permissions.invalidate()
+
 
     @hook
     def perms_deny_trigger(self, msg, args, argstr):
@@ -132,6 +145,7 @@ class Plugin(BasePlugin):
             mask = mask[1:]
             if mask in self.bot.deny_rules:
                 del self.bot.deny_rules[mask]
+                self.bot.permissions.invalidate()
                 self.cur.execute('DELETE FROM deny WHERE mask=?', (mask,))
                 self.db.commit()
             return
@@ -145,12 +159,14 @@ class Plugin(BasePlugin):
                     del rules[plugin]
                 except:
                     msg.reply('no rule exists for plugin "%s"' % plugin)
-                    return
+                    break
             else:
                 try:
                     plugin, level = arg.split('=', 1)
                     level = int(level)
                 except:
                     msg.reply('invalid syntax, "plugin=level" format required')
-                    return
+                    break
                 rules[plugin] = level
+
+        self.bot.permissions.invalidate()
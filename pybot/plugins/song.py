@@ -13,8 +13,10 @@ KEEP_RATIO = 0.1
 
 
 class Plugin(BasePlugin):
+    scope = 'global'
+
     def on_load(self):
-        self.db = sqlite3.connect(os.path.join(self.bot.core.data_path, 'song.db'))
+        self.db = sqlite3.connect(os.path.join(self.core.data_path, 'song.db'))
         self.cur = self.db.cursor()
         query = '''CREATE TABLE IF NOT EXISTS artist (
                        id INTEGER PRIMARY KEY,
@@ -48,6 +50,10 @@ class Plugin(BasePlugin):
         self.db.close()
 
 
+    def get_state(self):
+        return {'last_tracks': self.last_tracks}
+
+
     def add_track(self, artist, title, nick=None):
         track_added = False
 
@@ -81,7 +87,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if argstr:
             msg.reply('Unknown command, see help.')
             return
@@ -122,7 +128,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_add_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         try:
             artist, title = argstr.strip().split(' - ', 1)
         except:
@@ -154,7 +160,7 @@ class Plugin(BasePlugin):
     @level(500)
     @hook
     def song_delete_trigger(self, msg):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
@@ -175,7 +181,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_fix_artist_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if self.last_tracks.get(context) is None:
             msg.reply('No last track.')
             return True
@@ -230,7 +236,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_fix_title_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
@@ -260,7 +266,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_last_trigger(self, msg):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
@@ -288,7 +294,7 @@ class Plugin(BasePlugin):
     def song_load_trigger(self, msg, args, argstr):
         try:
             count = 0
-            filepath = os.path.join(self.bot.core.data_path, argstr)
+            filepath = os.path.join(self.core.data_path, argstr)
             with open(filepath) as f:
                 for line in f:
                     line = line.strip()
@@ -309,7 +315,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_search_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         query = '''SELECT track.id, track.youtube, artist.name || ' - ' || track.name AS song
                    FROM track
                    JOIN artist ON artist_id = artist.id
@@ -361,7 +367,7 @@ class Plugin(BasePlugin):
 
     @hook
     def song_who_trigger(self, msg):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
@@ -381,7 +387,7 @@ class Plugin(BasePlugin):
 
     @hook(('song youtube', 'song yt'))
     def song_youtube_trigger(self, msg, args, argstr):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
@@ -407,7 +413,7 @@ class Plugin(BasePlugin):
     @level(900)
     @hook(('song youtube delete', 'song yt delete'))
     def song_youtube_delete_trigger(self, msg):
-        context = msg.reply_to
+        context = (msg.bot.network, msg.reply_to)
         if not self.last_tracks.get(context):
             msg.reply('No last track.')
             return True
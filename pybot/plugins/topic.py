@@ -10,6 +10,10 @@ class Plugin(BasePlugin):
         self.last = {}
 
 
+    def get_state(self):
+        return {'last': self.last}
+
+
     @hook
     def topic_set_trigger(self, msg, args, argstr):
         now = datetime.utcnow()
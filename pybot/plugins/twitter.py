@@ -14,7 +14,7 @@ def tweet_cleaner(text):
     return hp.unescape(text.replace('\n', ' ').replace('\r', ''))
 
 
-def url_expander(sentence, msg):
+def url_expander(sentence):
     regex_tco = re.compile(r'https?://t.co/.*')
     urls = []
     words = sentence.split()
@@ -23,11 +23,12 @@ def url_expander(sentence, msg):
         m = re.match(regex_tco, word)
 
         if m:
-            idx = words.index(word)
-            r = requests.get(word)
+            r = requests.get(word, timeout=10)
 
             if r.status_code in [200, 301, 302]:
-                msg.reply(r.url)
+                urls.append(r.url)
+
+    return urls
 
 
 class Plugin(BasePlugin):
@@ -39,6 +40,50 @@ class Plugin(BasePlugin):
         self._api = tweepy.API(auth)
 
 
+    def reply(self, msg, lines):
+        for line in lines:
+            msg.reply(line)
+
+
+    def get_status(self, twitter_id):
+        try:
+            status = self._api.get_status(twitter_id, tweet_mode='extended')
+            return [tweet_cleaner(status.full_text)] + \
+                    url_expander(status.full_text)
+
+        except tweepy.TweepError as e:
+            return ['No Status for that ID.']
+
+
+    def get_user(self, name):
+        try:
+            user = self._api.get_user(name, tweet_mode='extended')
+            return [tweet_cleaner(user.status.full_text)] + \
+                    url_expander(user.status.full_text)
+
+        except tweepy.TweepError as e:
+            print(e)
+            return ['No user by that name.']
+
+
+    def search(self, keyword):
+        try:
+            cursor = tweepy.Cursor(self._api.search, q=keyword, rpp=1,
+                    tweet_mode='extended')
+
+            for c in cursor.items(1):
+                uname = c.author.name
+                return ['@{0}: {1}'.format(uname, tweet_cleaner(c.full_text))] \
+                        + url_expander(c.full_text)
+
+            else:
+                return ['No results.']
+
+        except tweepy.TweepError as e:
+            print(e)
+            return ['Update failed.']
+
+
     @hook('twitter.com')
     def twitter_url(self, msg, args, argstr):
         regx = re.compile(r'https?://twitter.com/[a-zA-Z0-9_\-]+/status/' \
@@ -50,27 +95,16 @@ class Plugin(BasePlugin):
         else:
             twitter_id = m.group('id')
 
-        try:
-            status = self._api.get_status(twitter_id, tweet_mode='extended')
-            msg.reply(tweet_cleaner(status.full_text))
-            url_expander(status.full_text, msg)
-
-        except tweepy.TweepError as e:
-            msg.reply('No Status for that ID.')
+        self.defer(msg, self.get_status, twitter_id,
+                callback=lambda lines: self.reply(msg, lines))
 
         return True
 
 
     @hook
     def twitter_user_trigger(self, msg, args, argstr):
-        try:
-            user = self._api.get_user(argstr, tweet_mode='extended')
-            msg.reply(tweet_cleaner(user.status.full_text))
-            url_expander(user.status.full_text, msg)
-
-        except tweepy.TweepError as e:
-            print(e)
-            msg.reply('No user by that name.')
+        self.defer(msg, self.get_user, argstr,
+                callback=lambda lines: self.reply(msg, lines))
 
 
     @hook
@@ -81,19 +115,5 @@ class Plugin(BasePlugin):
 
     @hook
     def twitter_search_trigger(self, msg, args, argstr):
-        try:
-            cursor = tweepy.Cursor(self._api.search, q=argstr, rpp=1,
-                    tweet_mode='extended')
-
-            for c in cursor.items(1):
-                uname = c.author.name
-                msg.reply('@{0}: {1}'.format(uname, tweet_cleaner(c.full_text)))
-                url_expander(c.full_text, msg)
-                break
-
-            else:
-                msg.reply('No results.')
-
-        except tweepy.TweepError as e:
-            print(e)
-            msg.reply('Update failed.')
+        self.defer(msg, self.search, argstr,
+                callback=lambda lines: self.reply(msg, lines))
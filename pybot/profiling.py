@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import sys
+from time import perf_counter
+
+
+class TimedLoader(object):
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+
+    def exec_module(self, module):
+        self.profiler.enter()
+        start = perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.leave(module.__name__, perf_counter() - start)
+
+
+class ImportProfiler(object):
+    def __init__(self):
+        self.times = []
+        self.stack = []
+        self.started = None
+
+
+    def install(self):
+        self.started = perf_counter()
+        sys.meta_path.insert(0, self)
+
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader and hasattr(spec.loader, 'exec_module'):
+                spec.loader = TimedLoader(spec.loader, self)
+            return spec
+        return None
+
+
+    def enter(self):
+        self.stack.append(0.0)
+
+
+    def leave(self, name, elapsed):
+        nested = self.stack.pop()
+        self.times.append((name, elapsed - nested, elapsed))
+        if self.stack:
+            self.stack[-1] += elapsed
+
+
+    def report(self):
+        lines = ['%10s | %10s | %s' % ('self [us]', 'cumulative', 'module')]
+        for name, own, cumulative in sorted(self.times,
+                key=lambda entry: -entry[2]):
+            lines.append('%10d | %10d | %s' % (own * 1e6, cumulative * 1e6,
+                    name))
+        lines.append('%d modules, %.3f s in imports, %.3f s to start' % (
+                len(self.times), sum(entry[1] for entry in self.times),
+                perf_counter() - self.started))
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.write(self.report())
+        print('import profile written to %s' % path)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import multiprocessing
+import multiprocessing.connection
+import signal
+from collections import OrderedDict
+from time import time
+
+from . import config
+from .core import Core
+from .watcher import ConfigWatcher
+
+
+RESTART_DELAY = 5
+RESTART_DELAY_MAX = 60
+STABLE_UPTIME = 300
+STATS_INTERVAL = 60
+
+
+def run_child(core_class, networks, conn, production):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    core = core_class(networks, conn, production=production)
+    core.run()
+
+
+class Child(object):
+    def __init__(self, name, networks):
+        self.name = name
+        self.networks = networks
+        self.process = None
+        self.conn = None
+        self.started = None
+        self.restarts = 0
+        self.restart_at = None
+        self.retired = False
+        self.stats = {}
+
+
+class Supervisor(object):
+    def __init__(self, core_class=Core, watch=False, production=False):
+        self.core_class = core_class
+        self.production = production
+        self.children = OrderedDict()
+        self.running = False
+        self.in_shutdown = False
+        self.next_stats = time() + STATS_INTERVAL
+
+        Core.init_paths(self)
+        self.reload()
+
+        self.watcher = None
+        if watch:
+            self.watcher = ConfigWatcher(self, self.config_path)
+
+
+    def groups(self):
+        groups = OrderedDict()
+        for network, options in config.config.items():
+            group = (options or {}).get('group', network)
+            groups.setdefault(group, []).append(network)
+        return groups
+
+
+    def reload(self):
+        config.load(self)
+        groups = self.groups()
+
+        for name, child in list(self.children.items()):
+            if name not in groups:
+                if not child.process:
+                    del self.children[name]
+                    continue
+                child.retired = True
+                self.send(child, 'shutdown', 'configuration reload')
+            else:
+                child.networks = groups[name]
+                self.send(child, 'reload', child.networks)
+
+        for name, networks in groups.items():
+            if name not in self.children:
+                child = Child(name, networks)
+                self.children[name] = child
+                self.start(child)
+
+
+    def start(self, child):
+        conn, child_conn = multiprocessing.Pipe()
+        child.process = multiprocessing.Process(target=run_child,
+                args=(self.core_class, child.networks, child_conn,
+                        self.production),
+                name='pybot-%s' % child.name)
+        child.process.start()
+        child_conn.close()
+        child.conn = conn
+        child.started = time()
+        child.restart_at = None
+        print("supervisor: started '%s' (pid %d) for %s" % (child.name,
+                child.process.pid, ', '.join(child.networks)))
+
+
+    def send(self, child, *message):
+        if not child.conn:
+            return
+        try:
+            child.conn.send(message)
+        except OSError:
+            pass
+
+
+    def receive(self, child):
+        try:
+            while child.conn.poll():
+                message = child.conn.recv()
+                self.dispatch(child, *message)
+        except (EOFError, OSError):
+            child.conn.close()
+            child.conn = None
+
+
+    def dispatch(self, child, command, *args):
+        if command == 'reload':
+            self.reload()
+        elif command == 'shutdown':
+            self.shutdown(*args)
+        elif command == 'stats':
+            child.stats = args[0]
+
+
+    def reap(self, child):
+        child.process.join()
+        if child.conn:
+            child.conn.close()
+            child.conn = None
+
+        exitcode = child.process.exitcode
+        child.process = None
+
+        if self.in_shutdown or child.retired or exitcode == 0:
+            print("supervisor: '%s' exited" % child.name)
+            del self.children[child.name]
+            return
+
+        if time() - child.started > STABLE_UPTIME:
+            child.restarts = 0
+        delay = min(RESTART_DELAY * 2 ** child.restarts, RESTART_DELAY_MAX)
+        child.restarts += 1
+        child.restart_at = time() + delay
+        print("supervisor: '%s' died with exit code %s, restarting in %ds" %
+                (child.name, exitcode, delay))
+
+
+    def print_stats(self, *args):
+        for name, child in self.children.items():
+            pid = child.process.pid if child.process else None
+            print("supervisor: '%s' pid=%s restarts=%d" % (name, pid,
+                    child.restarts))
+            for network, stats in child.stats.items():
+                print('  %s: %s' % (network, ', '.join('%s=%s' % item
+                        for item in stats.items())))
+
+
+    def run(self):
+        self.running = True
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.print_stats)
+
+        while self.running:
+            try:
+                self.tick()
+            except KeyboardInterrupt:
+                self.shutdown('KeyboardInterrupt')
+            if self.in_shutdown and not self.children:
+                self.running = False
+
+
+    def wakeup(self, timestamp=None):
+        pass
+
+
+    def tick(self):
+        deadlines = [self.next_stats]
+        deadlines += [child.restart_at for child in self.children.values()
+                if child.restart_at is not None]
+        if self.watcher and self.watcher.next_tick() is not None:
+            deadlines.append(self.watcher.next_tick())
+        timeout = max(0, min(deadlines) - time())
+
+        waitables = {}
+        if self.watcher and self.watcher.fd is not None:
+            waitables[self.watcher.fd] = self.watcher
+        for child in self.children.values():
+            if child.conn:
+                waitables[child.conn] = child
+            if child.process:
+                waitables[child.process.sentinel] = child
+
+        for ready in multiprocessing.connection.wait(list(waitables),
+                timeout):
+            child = waitables[ready]
+            if child is self.watcher:
+                self.watcher.do_read()
+            elif ready is child.conn:
+                self.receive(child)
+            elif child.process and ready == child.process.sentinel:
+                self.reap(child)
+
+        timestamp = time()
+        if self.watcher and self.watcher.next_tick() is not None and \
+                self.watcher.next_tick() <= timestamp:
+            self.watcher.do_tick(timestamp)
+
+        for child in list(self.children.values()):
+            if child.restart_at is not None and child.restart_at <= timestamp:
+                self.start(child)
+
+        if self.next_stats <= timestamp:
+            self.next_stats = timestamp + STATS_INTERVAL
+            for child in self.children.values():
+                self.send(child, 'stats')
+
+
+    def shutdown(self, reason=''):
+        if self.in_shutdown:
+            for child in self.children.values():
+                if child.process:
+                    child.process.terminate()
+            return
+
+        self.in_shutdown = True
+        for name, child in list(self.children.items()):
+            if child.process:
+                self.send(child, 'shutdown', reason)
+            else:
+                del self.children[name]
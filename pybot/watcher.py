@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import traceback
+from time import time
+
+from .interface import SelectableInterface
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+
+event_header = struct.Struct('iIII')
+
+
+def inotify_watch(directory):
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    wd = libc.inotify_add_watch(fd, os.fsencode(directory),
+            IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+    if wd < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, os.strerror(errno))
+    return fd
+
+
+class ConfigWatcher(SelectableInterface):
+    poll_interval = 2.0
+    settle_delay = 0.25
+
+    def __init__(self, owner, path):
+        self.owner = owner
+        self.path = path
+        self.directory, filename = os.path.split(os.path.abspath(path))
+        self.filename = os.fsencode(filename)
+        self.stamp = self.stat()
+        self.pending = None
+        self.next_poll = None
+
+        try:
+            self.fd = inotify_watch(self.directory)
+        except (OSError, AttributeError) as e:
+            print('config watcher: inotify unavailable (%s), polling' % e)
+            self.fd = None
+            self.next_poll = time() + self.poll_interval
+
+
+    def stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+
+    def fileno(self):
+        return self.fd
+
+
+    def can_read(self):
+        return self.fd is not None
+
+
+    def do_read(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = event_header.unpack_from(data, offset)
+                offset += event_header.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name == self.filename or mask & IN_Q_OVERFLOW:
+                    changed = True
+
+        if changed:
+            self.pending = time() + self.settle_delay
+            self.owner.wakeup(self.pending)
+
+
+    def next_tick(self):
+        timestamps = [timestamp for timestamp in (self.pending,
+                self.next_poll) if timestamp is not None]
+        return min(timestamps) if timestamps else None
+
+
+    def do_tick(self, timestamp):
+        if self.next_poll is not None and timestamp >= self.next_poll:
+            self.next_poll = timestamp + self.poll_interval
+            if self.pending is None and self.stat() != self.stamp:
+                self.pending = timestamp + self.settle_delay
+
+        if self.pending is None or timestamp < self.pending:
+            return
+
+        self.pending = None
+        stamp = self.stat()
+        if stamp is None or stamp == self.stamp:
+            return
+
+        self.stamp = stamp
+        print('config watcher: %s changed, reloading' % self.path)
+        try:
+            self.owner.reload()
+        except:
+            print('config watcher: reload failed')
+            traceback.print_exc()
+
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
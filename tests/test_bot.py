@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+from pybot.bot import split_utf8
+
+
+def test_split_keeps_leading_and_internal_spaces():
+    assert split_utf8('  * ANY=1', 400) == ['  * ANY=1']
+    assert split_utf8('name    level\n  perms   1000', 400) == \
+        ['name    level   perms   1000']
+
+
+def test_split_strips_only_at_cut_points():
+    lines = split_utf8('  aaaa  bbbb   cccccccccccc dddd  ', 16)
+    assert lines == ['  aaaa  bbbb', 'cccccccccccc', 'dddd']
+
+
+def test_split_respects_utf8_boundaries():
+    text = u'é' * 20
+    lines = split_utf8(text, 16)
+    assert ''.join(lines) == text
+    assert all(len(line.encode('utf-8')) <= 16 for line in lines)
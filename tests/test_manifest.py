@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+import json
+import os
+
+import pytest
+
+from pybot import manifest
+from pybot.plugins import choose, perms
+
+
+class Core(object):
+    def __init__(self, path):
+        self.data_path = path
+
+
+class Bot(object):
+    def __init__(self, path):
+        self.core = Core(path)
+
+
+@pytest.fixture
+def bot(tmpdir):
+    manifest.stamp = None
+    return Bot(str(tmpdir))
+
+
+def write_manifest(bot, entries):
+    with open(manifest.path(bot.core), 'w') as f:
+        json.dump(entries, f)
+    manifest.stamp = None
+
+
+def test_perms_with_declared_hooks_is_never_deferred(bot):
+    options = {'hooks': {'trigger': ['perms list']}}
+    assert manifest.hooks_for(bot, 'perms', options) is None
+
+    write_manifest(bot, {'perms': manifest.describe(perms.Plugin)})
+    assert manifest.hooks_for(bot, 'perms', options) is None
+
+
+def test_unknown_plugin_needs_explicit_opt_in(bot):
+    options = {'hooks': {'trigger': 'choose'}}
+    assert manifest.hooks_for(bot, 'choose', options) is None
+
+    options['lazy'] = True
+    assert manifest.hooks_for(bot, 'choose', options) == \
+        [('trigger', 'choose', 1, 500)]
+
+
+def test_declared_hooks_take_manifest_levels(bot):
+    write_manifest(bot, {'choose': manifest.describe(choose.Plugin)})
+    entry = manifest.load(bot.core)['choose']
+    hooks = manifest.hooks_for(bot, 'choose', {'hooks': {'trigger': 'choose'}})
+    assert hooks == [tuple(hook) for hook in entry['hooks']
+                     if hook[1] == 'choose']
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# vim: set ts=4 et
+
+from pybot.plugin import BasePlugin
+
+
+class Core(object):
+    def call_soon_threadsafe(self, fn, *args):
+        fn(*args)
+
+
+class Bot(object):
+    network = 'test'
+    core = Core()
+
+
+class Plugin(BasePlugin):
+    max_workers = 1
+
+
+def test_max_workers_caps_configured_workers():
+    plugin = Plugin(Bot(), 'capped', None)
+    plugin.config = {'workers': 8}
+    plugin.submit(lambda: None).result()
+    assert plugin.executor._max_workers == 1
+    plugin.shutdown_executor(True)
+
+
+class Message(object):
+    def __init__(self):
+        self.replies = []
+
+
+    def reply(self, text):
+        self.replies.append(text)
+
+
+def test_defer_replies_busy_when_queue_is_full():
+    plugin = Plugin(Bot(), 'full', None)
+    plugin.config = {'queue_depth': 0}
+    msg = Message()
+    assert plugin.defer(msg, lambda: None) is None
+    assert msg.replies == ['Busy, try again in a moment.']